@@ -5,8 +5,10 @@ from flask_migrate import Migrate
 from flask_login import LoginManager, login_required, current_user
 from flask_wtf.csrf import CSRFProtect
 from config import Config
+from app import fragment_cache, log_pipeline, warmup
+from app.replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 csrf = CSRFProtect()
@@ -15,6 +17,9 @@ csrf = CSRFProtect()
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    log_pipeline.init_app(app)
+    warmup.init_template_cache(app)
+    fragment_cache.init_app(app)
 
     db.init_app(app)
     migrate.init_app(app, db)
@@ -24,15 +29,46 @@ def create_app():
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
 
+    from app import catalog, fragments, loading, memory_profile, metrics, replicas, sqlite_profile, user_cache
+    sqlite_profile.init_app(app, db)
+    metrics.init_app(app, db)
+    memory_profile.init_app(app)
+    loading.init_app(app, db)
+    replicas.init_app(app, db)
+    user_cache.init_app(app)
+    catalog.init_app(app)
+    fragments.init_app(app)
+
+    from app.routes.api import api
     from app.routes.auth import auth
+    from app.routes.catalog import catalog as catalog_bp
     from app.routes.clients import clients
     from app.routes.invoices import invoices
     from app.routes.payments import payments
+    from app.routes.reports import reports
 
+    app.register_blueprint(api)
     app.register_blueprint(auth)
+    app.register_blueprint(catalog_bp)
     app.register_blueprint(clients)
     app.register_blueprint(invoices)
     app.register_blueprint(payments)
+    app.register_blueprint(reports)
+
+    from app.maintenance import maintenance_cli
+    from app.index_advisor import indexes_cli
+    from app.rollups import reports_cli
+    from app.change_feed import changes_cli
+    from app.archive import archive_cli
+    from app.catalog import catalog_cli
+    from app.data_dump import data_cli
+    app.cli.add_command(maintenance_cli)
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(changes_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(data_cli)
 
     @app.route('/')
     def index():
@@ -43,16 +79,17 @@ def create_app():
     @app.route('/dashboard')
     @login_required
     def dashboard():
-        from app.models import Client, Invoice, Payment
+        from app import read_models
+        from app.models import Client, DailyRevenue, Invoice, Payment
+        from app.loading import profile
+        from app.totals import load_totals
         from datetime import datetime, timezone, date
         from sqlalchemy import func
 
         total_clients = Client.query.count()
 
-        # Load all invoices once (items & payments eager-loaded via selectin)
-        all_invoices = Invoice.query.options(
-            db.joinedload(Invoice.client)
-        ).all()
+        # Load all invoices once; their totals come from one aggregate query
+        all_invoices = load_totals(Invoice.query.options(*profile('invoice.totals')).all())
         outstanding = [inv for inv in all_invoices if inv.get_status() in ('sent', 'partial', 'overdue')]
         outstanding_total = sum(inv.calculate_balance() for inv in outstanding)
         outstanding_count = len(outstanding)
@@ -63,17 +100,14 @@ def create_app():
             func.coalesce(func.sum(Payment.amount), 0)
         ).filter(Payment.payment_date >= first_of_month.date()).scalar()
 
+        # From the rollup, which keeps counting payments once their invoice is archived
         all_time_revenue = db.session.query(
-            func.coalesce(func.sum(Payment.amount), 0)
+            func.coalesce(func.sum(DailyRevenue.amount), 0)
         ).scalar()
 
-        recent_invoices = Invoice.query.options(
-            db.joinedload(Invoice.client)
-        ).order_by(Invoice.created_at.desc()).limit(5).all()
-        recent_clients = Client.query.order_by(Client.created_at.desc()).limit(5).all()
-        recent_payments = Payment.query.options(
-            db.joinedload(Payment.invoice)
-        ).order_by(Payment.created_at.desc()).limit(5).all()
+        recent_invoices = read_models.invoice_rows(limit=5)
+        recent_clients = read_models.client_rows(order_by=[Client.created_at.desc()], limit=5)
+        recent_payments = read_models.payment_rows(order_by=[Payment.created_at.desc()], limit=5)
 
         return render_template('dashboard.html',
                                total_clients=total_clients,
@@ -85,6 +119,8 @@ def create_app():
                                recent_clients=recent_clients,
                                recent_payments=recent_payments)
 
+    warmup.init_app(app, db)
+
     # Only create tables if they don't exist (for development)
     # In production, use migrations instead
     # with app.app_context():
@@ -0,0 +1,169 @@
+"""Archival of settled invoices into cold tables.
+
+Fully paid invoices older than ``ARCHIVE_AFTER_DAYS`` (with no payment in
+that period either) are moved, with their line items and payments, into
+``archived_invoice``, ``archived_invoice_item`` and ``archived_payment``::
+
+    flask --app wsgi archive run [--older-than-days N] [--dry-run]
+
+Each batch of ``ARCHIVE_BATCH_SIZE`` invoices is copied and deleted in one
+transaction with set-based statements. Archived invoices keep their ids
+and numbers, and their total and amount paid are frozen on the archive
+row; ``ClientStats`` and the revenue rollups (app/rollups.py) count them,
+so client totals and reports do not change. They can be browsed and
+searched under ``/invoices/archive``. The ``archive-invoices`` maintenance
+job runs this daily unless ``ARCHIVE_AFTER_DAYS`` is 0.
+"""
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, exists, func, insert, literal, select
+
+from app import db
+from app.models import (ArchivedInvoice, ArchivedInvoiceItem, ArchivedPayment, ChangeRecord, Client, Invoice,
+                        InvoiceItem, Payment)
+from app.rollups import refresh_client_stats
+from app.totals import fetch_sums, item_sums, payment_sums
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _settled(tax_rate, sums):
+    subtotal, taxable, paid = sums
+    total = subtotal + taxable * (tax_rate or 0)
+    # Same rule as Invoice.get_status() == 'paid'
+    return total > 0 and paid >= total
+
+
+def find_settled(conn, cutoff, after_id, limit):
+    """Ids of the next `limit` settled invoices past `after_id` created before `cutoff`.
+
+    Also returns the last id examined, so the caller can page through
+    invoices that turned out not to be settled.
+    """
+    recent_payment = exists().where(Payment.invoice_id == Invoice.id, Payment.payment_date >= cutoff.date())
+    rows = conn.execute(
+        select(Invoice.id, Invoice.tax_rate)
+        .where(Invoice.id > after_id, Invoice.status != 'draft', Invoice.created_at < cutoff, ~recent_payment)
+        .order_by(Invoice.id).limit(limit)
+    ).all()
+    sums = fetch_sums(conn, [row.id for row in rows])
+    settled = [row.id for row in rows if _settled(row.tax_rate, sums.get(row.id, (0, 0, 0)))]
+    return settled, rows[-1].id if rows else None
+
+
+def archive_invoices(conn, invoice_ids):
+    """Copy these invoices, their items and payments into the archive tables and delete them."""
+    now = _utcnow()
+    items = item_sums(invoice_ids)
+    paid = payment_sums(invoice_ids)
+    subtotal = func.coalesce(items.c.subtotal, 0)
+    total = subtotal + func.coalesce(items.c.taxable, 0) * func.coalesce(Invoice.tax_rate, 0)
+    conn.execute(insert(ArchivedInvoice).from_select(
+        ['id', 'client_id', 'invoice_number', 'status', 'due_date', 'notes', 'tax_rate', 'total', 'paid',
+         'created_at', 'updated_at', 'archived_at'],
+        select(Invoice.id, Invoice.client_id, Invoice.invoice_number, Invoice.status, Invoice.due_date,
+               Invoice.notes, Invoice.tax_rate, total, func.coalesce(paid.c.paid, 0),
+               Invoice.created_at, Invoice.updated_at, literal(now, ArchivedInvoice.archived_at.type))
+        .outerjoin(items, items.c.invoice_id == Invoice.id)
+        .outerjoin(paid, paid.c.invoice_id == Invoice.id)
+        .where(Invoice.id.in_(invoice_ids))
+    ))
+    item_columns = ['id', 'invoice_id', 'description', 'quantity', 'unit_price', 'taxable']
+    conn.execute(insert(ArchivedInvoiceItem).from_select(
+        item_columns,
+        select(*(getattr(InvoiceItem, c) for c in item_columns)).where(InvoiceItem.invoice_id.in_(invoice_ids))
+    ))
+    payment_columns = ['id', 'invoice_id', 'amount', 'payment_date', 'method', 'reference_note', 'created_at']
+    conn.execute(insert(ArchivedPayment).from_select(
+        payment_columns,
+        select(*(getattr(Payment, c) for c in payment_columns)).where(Payment.invoice_id.in_(invoice_ids))
+    ))
+
+    client_ids = conn.execute(
+        select(Invoice.client_id).where(Invoice.id.in_(invoice_ids)).distinct()).scalars().all()
+    conn.execute(delete(Payment).where(Payment.invoice_id.in_(invoice_ids)))
+    conn.execute(delete(InvoiceItem).where(InvoiceItem.invoice_id.in_(invoice_ids)))
+    conn.execute(delete(Invoice).where(Invoice.id.in_(invoice_ids)))
+
+    # These statements bypass the flush hooks: tell change feed consumers the
+    # invoices left the hot tables, and recount the clients (unchanged totals)
+    conn.execute(insert(ChangeRecord), [
+        {'entity': 'Invoice', 'entity_id': inv_id, 'op': 'delete',
+         'changes': {'archived': [False, True]}, 'created_at': now}
+        for inv_id in invoice_ids
+    ])
+    refresh_client_stats(conn, client_ids)
+
+
+def run(older_than_days=None, batch_size=None, dry_run=False):
+    """Archive every settled invoice older than the cutoff, one batch per transaction."""
+    days = older_than_days if older_than_days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = (_utcnow() - timedelta(days=days)).replace(tzinfo=None)
+    archived = 0
+    after_id = 0
+    while True:
+        conn = db.session.connection()
+        invoice_ids, last_seen = find_settled(conn, cutoff, after_id, batch_size)
+        if last_seen is None:
+            break
+        after_id = last_seen
+        if invoice_ids and not dry_run:
+            archive_invoices(conn, invoice_ids)
+            db.session.commit()
+        archived += len(invoice_ids)
+    db.session.rollback()
+    return archived
+
+
+def archive_job():
+    if not current_app.config['ARCHIVE_AFTER_DAYS']:
+        return 'disabled (ARCHIVE_AFTER_DAYS=0)'
+    return f'archived {run()} invoices'
+
+
+def search(query=None, client_id=None):
+    """Archived invoices matching an invoice number, client name or line item description."""
+    stmt = ArchivedInvoice.query.join(Client, Client.id == ArchivedInvoice.client_id)
+    if client_id is not None:
+        stmt = stmt.filter(ArchivedInvoice.client_id == client_id)
+    if query:
+        like = f'%{query}%'
+        stmt = stmt.filter(
+            ArchivedInvoice.invoice_number.ilike(like)
+            | (Client.first_name + ' ' + Client.last_name).ilike(like)
+            | exists().where(ArchivedInvoiceItem.invoice_id == ArchivedInvoice.id,
+                             ArchivedInvoiceItem.description.ilike(like))
+        )
+    return stmt.order_by(ArchivedInvoice.created_at.desc())
+
+
+# ---------- CLI ----------
+
+archive_cli = AppGroup('archive', help='Move settled invoices into the archive tables.')
+
+
+@archive_cli.command('run')
+@click.option('--older-than-days', type=int, help='Defaults to ARCHIVE_AFTER_DAYS.')
+@click.option('--batch-size', type=int, help='Invoices per transaction; defaults to ARCHIVE_BATCH_SIZE.')
+@click.option('--dry-run', is_flag=True, help='Only count the invoices that would be archived.')
+def run_command(older_than_days, batch_size, dry_run):
+    """Archive settled invoices."""
+    count = run(older_than_days, batch_size, dry_run)
+    click.echo(f"{'Would archive' if dry_run else 'Archived'} {count} invoices.")
+
+
+@archive_cli.command('status')
+def status_command():
+    """Show how many invoices, items and payments are hot and archived."""
+    for label, hot, cold in (('invoices', Invoice, ArchivedInvoice),
+                             ('line items', InvoiceItem, ArchivedInvoiceItem),
+                             ('payments', Payment, ArchivedPayment)):
+        hot_count = db.session.execute(select(func.count()).select_from(hot)).scalar()
+        cold_count = db.session.execute(select(func.count()).select_from(cold)).scalar()
+        click.echo(f'{label:12} {hot_count:>8} hot {cold_count:>8} archived')
@@ -0,0 +1,45 @@
+"""Delete many clients or invoices with one statement.
+
+The foreign keys cascade (``ON DELETE CASCADE``), so a single ``DELETE``
+removes the selected clients or invoices together with their invoices,
+line items, payments, archived invoices, stats rows and queued emails,
+without loading any of them. Because the statement bypasses the flush
+hooks, the rollups and change feed are updated here explicitly, in the
+same transaction.
+"""
+from sqlalchemy import delete, select
+
+from app import db
+from app.change_feed import record_deletes
+from app.models import Client, Invoice
+from app.rollups import apply_deltas, invoices_of_clients, lock_invoices, refresh_client_stats, snapshot
+
+
+def _delete(model, ids, client_ids=(), invoice_ids=()):
+    conn = db.session.connection()
+    affected = set(invoice_ids) | invoices_of_clients(conn, client_ids)
+    lock_invoices(conn, affected)
+    before = snapshot(conn, affected)
+    record_deletes(conn, client_ids=client_ids, invoice_ids=invoice_ids)
+    deleted = conn.execute(delete(model).where(model.id.in_(ids))).rowcount
+    apply_deltas(conn, before, snapshot(conn, affected))
+    refresh_client_stats(conn, {f.client_id for f in before['facts'].values()} | set(client_ids))
+    # Core statements do not mark the session as written; keep the user on the primary (app/replicas.py)
+    db.session.info['wrote'] = True
+    return deleted
+
+
+def delete_clients(client_ids):
+    """Delete these clients and everything they own; the caller commits. Returns the number deleted."""
+    client_ids = db.session.execute(select(Client.id).where(Client.id.in_(client_ids))).scalars().all()
+    if not client_ids:
+        return 0
+    return _delete(Client, client_ids, client_ids=client_ids)
+
+
+def delete_invoices(invoice_ids):
+    """Delete these invoices with their line items and payments; the caller commits. Returns the number deleted."""
+    invoice_ids = db.session.execute(select(Invoice.id).where(Invoice.id.in_(invoice_ids))).scalars().all()
+    if not invoice_ids:
+        return 0
+    return _delete(Invoice, invoice_ids, invoice_ids=invoice_ids)
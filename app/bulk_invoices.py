@@ -0,0 +1,84 @@
+"""Issue the same invoice to many clients at once (fleet and club events).
+
+The source is an existing invoice or a saved ``InvoiceTemplate``. All the
+invoices and their line items are written with one multi-row INSERT each,
+numbered from one contiguous block, in a single transaction. Because these
+statements bypass the flush hooks, the rollups, change feed and (optional)
+email queue are updated here explicitly.
+"""
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.change_feed import record_inserts
+from app.email_queue import queue_invoice_emails
+from app.models import ArchivedInvoice, Client, Invoice, InvoiceItem, InvoiceTemplate
+from app.rollups import add_new_invoices
+
+Source = namedtuple('Source', ['tax_rate', 'notes', 'items'])
+Issued = namedtuple('Issued', ['invoice_ids', 'numbers', 'unemailed'])
+
+ITEM_FIELDS = ('description', 'quantity', 'unit_price', 'taxable')
+
+
+def from_invoice(invoice):
+    return Source(invoice.tax_rate, invoice.notes,
+                  [{field: getattr(item, field) for field in ITEM_FIELDS} for item in invoice.items])
+
+
+def from_template(template):
+    return Source(template.tax_rate, template.notes, list(template.items))
+
+
+def save_template(name, source):
+    template = InvoiceTemplate(name=name, tax_rate=source.tax_rate, notes=source.notes, items=source.items)
+    db.session.add(template)
+    return template
+
+
+def reserve_numbers(conn, count):
+    """`count` consecutive invoice numbers after the highest id in use, skipping any already taken."""
+    start = max(conn.execute(select(func.max(Invoice.id))).scalar() or 0,
+                conn.execute(select(func.max(ArchivedInvoice.id))).scalar() or 0) + 1
+    while True:
+        numbers = [f'INV-{n:04d}' for n in range(start, start + count)]
+        taken = [conn.execute(select(model.invoice_number).where(model.invoice_number.in_(numbers))).scalars().all()
+                 for model in (Invoice, ArchivedInvoice)]
+        if not any(taken):
+            return numbers
+        start = max(int(number.rsplit('-', 1)[1]) for number in taken[0] + taken[1]) + 1
+
+
+def issue(source, client_ids, status='draft', due_date=None, email=False):
+    """Create one invoice per client from `source`; the caller commits."""
+    conn = db.session.connection()
+    client_ids = conn.execute(select(Client.id).where(Client.id.in_(client_ids)).order_by(Client.id)).scalars().all()
+    if not client_ids:
+        return Issued([], [], 0)
+
+    now = datetime.now(timezone.utc)
+    numbers = reserve_numbers(conn, len(client_ids))
+    invoice_rows = [{'client_id': client_id, 'invoice_number': number, 'status': status, 'due_date': due_date,
+                     'tax_rate': source.tax_rate, 'notes': source.notes, 'created_at': now, 'updated_at': now}
+                    for client_id, number in zip(client_ids, numbers)]
+    invoice_ids = conn.execute(
+        insert(Invoice).returning(Invoice.id, sort_by_parameter_order=True), invoice_rows).scalars().all()
+    for row, invoice_id in zip(invoice_rows, invoice_ids):
+        row['id'] = invoice_id
+
+    item_rows = [{'invoice_id': invoice_id, **{field: line[field] for field in ITEM_FIELDS}}
+                 for invoice_id in invoice_ids for line in source.items]
+    if item_rows:
+        item_ids = conn.execute(
+            insert(InvoiceItem).returning(InvoiceItem.id, sort_by_parameter_order=True), item_rows).scalars().all()
+        for row, item_id in zip(item_rows, item_ids):
+            row['id'] = item_id
+
+    add_new_invoices(conn, invoice_ids)
+    record_inserts(conn, Invoice, invoice_rows)
+    if item_rows:
+        record_inserts(conn, InvoiceItem, item_rows)
+    unemailed = queue_invoice_emails(conn, invoice_ids) if email else 0
+    return Issued(invoice_ids, numbers, unemailed)
@@ -0,0 +1,174 @@
+"""Service and parts catalog behind the invoice line item typeahead.
+
+``CatalogItem`` rows hold a canonical description with its default price
+and taxable flag. They are seeded from the distinct descriptions on past
+invoices (hot and archived)::
+
+    flask --app wsgi catalog seed
+
+After that each entry's ``times_used`` is kept current by the
+``catalog-usage`` maintenance job, a change feed consumer that recounts the
+entries whose descriptions were added to, edited on or removed from line
+items since its last run.
+
+Suggestions come from ``catalog_index``, an in-memory prefix index over
+every word of every description, so a lookup is a binary search rather
+than a query. The index is rebuilt on the next lookup after a catalog
+change is committed in this process, and otherwise every
+``CATALOG_INDEX_TTL`` seconds so other workers pick up changes.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, func, insert, literal, select, union_all, update
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.change_feed import FeedConsumer
+from app.models import ArchivedInvoiceItem, CatalogItem, InvoiceItem
+
+Suggestion = namedtuple('Suggestion', ['id', 'description', 'unit_price', 'taxable', 'times_used'])
+
+
+class CatalogIndex:
+    """Thread-safe prefix index of catalog descriptions, loaded lazily and replaced whole."""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._keys = []       # sorted (lowercased text from a word start, entry position)
+        self._entries = []
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def _build(self, rows):
+        entries = [Suggestion(*row) for row in rows]
+        keys = []
+        for pos, entry in enumerate(entries):
+            text = entry.description.lower()
+            starts = [0] + [i + 1 for i, ch in enumerate(text) if ch in ' -+/(' and i + 1 < len(text)]
+            keys.extend((text[start:], pos) for start in starts)
+        keys.sort()
+        return keys, entries
+
+    def _load(self):
+        rows = db.session.execute(
+            select(CatalogItem.id, CatalogItem.description, CatalogItem.unit_price, CatalogItem.taxable,
+                   CatalogItem.times_used)
+        ).all()
+        keys, entries = self._build(rows)
+        with self._lock:
+            self._keys, self._entries = keys, entries
+            self._expires = time.monotonic() + self.ttl
+
+    def search(self, query, limit=10):
+        """Catalog entries with a word starting with `query`, most used first."""
+        query = ' '.join(query.lower().split())
+        if not query:
+            return []
+        if self._expires < time.monotonic():
+            self._load()
+        with self._lock:
+            keys, entries = self._keys, self._entries
+        matches = {}
+        for key, pos in keys[bisect_left(keys, (query,)):]:
+            if not key.startswith(query):
+                break
+            # Prefer entries whose description starts with the query
+            prefix = key == entries[pos].description.lower()
+            matches[pos] = matches.get(pos, False) or prefix
+        ranked = sorted(matches, key=lambda pos: (not matches[pos], -entries[pos].times_used,
+                                                  entries[pos].description.lower()))
+        return [entries[pos] for pos in ranked[:limit]]
+
+    def invalidate(self):
+        with self._lock:
+            self._expires = 0.0
+
+
+catalog_index = CatalogIndex()
+
+
+def init_app(app):
+    catalog_index.ttl = app.config['CATALOG_INDEX_TTL']
+
+
+@event.listens_for(CatalogItem, 'after_insert')
+@event.listens_for(CatalogItem, 'after_update')
+@event.listens_for(CatalogItem, 'after_delete')
+def _queue_catalog_invalidation(mapper, connection, target):
+    object_session(target).info['catalog_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_catalog(session):
+    if session.info.pop('catalog_changed', False):
+        catalog_index.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_change(session):
+    session.info.pop('catalog_changed', None)
+
+
+def seed_from_history():
+    """Add a catalog entry for each past line item description not in the catalog yet.
+
+    Descriptions are matched ignoring case and surrounding spaces; each entry
+    takes its price and taxable flag from the most recent line item.
+    """
+    items = union_all(
+        select(InvoiceItem.id, InvoiceItem.description, InvoiceItem.unit_price, InvoiceItem.taxable),
+        select(ArchivedInvoiceItem.id, ArchivedInvoiceItem.description, ArchivedInvoiceItem.unit_price,
+               ArchivedInvoiceItem.taxable),
+    ).subquery()
+    key = func.lower(func.trim(items.c.description))
+    latest = select(key.label('key'), func.count().label('uses'), func.max(items.c.id).label('latest_id')) \
+        .where(func.trim(items.c.description) != '').group_by(key).subquery()
+    known = select(func.lower(CatalogItem.description))
+    now = literal(datetime.now(timezone.utc), CatalogItem.created_at.type)
+    result = db.session.execute(insert(CatalogItem).from_select(
+        ['description', 'unit_price', 'taxable', 'times_used', 'created_at', 'updated_at'],
+        select(func.trim(items.c.description), items.c.unit_price, func.coalesce(items.c.taxable, False),
+               latest.c.uses, now, now)
+        .join(latest, latest.c.latest_id == items.c.id)
+        .where(latest.c.key.not_in(known))
+    ))
+    db.session.commit()
+    catalog_index.invalidate()
+    return result.rowcount
+
+
+def count_usage(changes):
+    """Recount ``times_used`` for the catalog entries matching line item descriptions in these changes."""
+    descriptions = {value for change in changes if change.entity == 'InvoiceItem'
+                    for value in (change.changes or {}).get('description', ()) if value and value.strip()}
+    if not descriptions:
+        return
+    items = union_all(select(InvoiceItem.description), select(ArchivedInvoiceItem.description)).subquery()
+    uses = select(func.count()).where(func.lower(func.trim(items.c.description)) == func.lower(CatalogItem.description))
+    db.session.execute(
+        update(CatalogItem)
+        .where(func.lower(CatalogItem.description).in_([func.lower(func.trim(value)) for value in descriptions]))
+        .values(times_used=uses.scalar_subquery())
+    )
+    db.session.info['catalog_changed'] = True
+
+
+def usage_job():
+    return f'counted usage from {FeedConsumer("catalog-usage").run(count_usage)} changes'
+
+
+# ---------- CLI ----------
+
+catalog_cli = AppGroup('catalog', help='Service and parts catalog.')
+
+
+@catalog_cli.command('seed')
+def seed_command():
+    """Add catalog entries for line item descriptions used on past invoices."""
+    click.echo(f'Added {seed_from_history()} catalog entries.')
@@ -0,0 +1,314 @@
+"""Change feed: a log of every client, invoice, line item and payment write.
+
+Each ORM flush appends one ``ChangeRecord`` per inserted, updated or
+deleted row, in the same transaction, with the money-relevant fields (and
+line item descriptions) that changed as ``{field: [old, new]}`` (``old`` is null on insert, ``new`` on
+delete). Item and payment records always carry ``invoice_id``. Deleting a
+client or invoice also records the rows the database removes with it
+through ``ON DELETE CASCADE``. Bulk ``Query.update()`` / ``Query.delete()``
+bypasses the feed; app/bulk_delete.py records its deletes itself.
+
+Anything that derives data from those tables (caches, search indexes,
+rollups) reads the feed from its own stored offset instead of recomputing
+from scratch, and picks up where it left off after a restart. The catalog
+usage counts are kept this way (``catalog-usage`` job, app/catalog.py)::
+
+    FeedConsumer('catalog-usage').run(count_usage)
+
+``run()`` acknowledges each batch in the same transaction as whatever the
+handler wrote, so a consumer that updates database tables sees every
+change exactly once. Records are pruned by the ``prune-changes``
+maintenance job once every consumer has read them, or after
+``CHANGE_FEED_RETENTION_DAYS`` regardless.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, inspect, or_, select, update
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models import ChangeRecord, Client, FeedOffset, Invoice, InvoiceItem, Payment
+
+# Fields whose old and new values are recorded; other columns only produce an empty update record
+TRACKED = {
+    Client: ('vehicle_make',),
+    Invoice: ('client_id', 'status', 'due_date', 'tax_rate'),
+    InvoiceItem: ('invoice_id', 'description', 'quantity', 'unit_price', 'taxable'),
+    Payment: ('invoice_id', 'amount', 'payment_date', 'method'),
+}
+# Included even when unchanged, so consumers know which invoice a child belongs to
+ALWAYS = {InvoiceItem: ('invoice_id',), Payment: ('invoice_id',)}
+
+Change = namedtuple('Change', ['id', 'entity', 'entity_id', 'op', 'changes', 'created_at'])
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt is not None and dt.tzinfo is None else dt
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+# ---------- Recording ----------
+
+def _changes(target, op):
+    state = inspect(target)
+    changes = {}
+    for field in TRACKED[type(target)]:
+        history = state.attrs[field].history
+        value = state.dict.get(field)
+        if op == 'insert':
+            old, new = None, value
+        elif op == 'delete':
+            old, new = history.deleted[0] if history.deleted else value, None
+        elif history.has_changes():
+            old, new = history.deleted[0] if history.deleted else None, value
+        elif field in ALWAYS.get(type(target), ()):
+            old = new = value
+        else:
+            continue
+        changes[field] = [_json_value(old), _json_value(new)]
+    return changes
+
+
+def _queue(op):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if op == 'update' and not session.is_modified(target, include_collections=False):
+            return
+        session.info.setdefault('change_feed', []).append({
+            'entity': type(target).__name__, 'entity_id': target.id, 'op': op,
+            'changes': _changes(target, op), 'created_at': _utcnow(),
+        })
+    return listener
+
+
+for _model in TRACKED:
+    for _op in ('insert', 'update', 'delete'):
+        event.listen(_model, f'after_{_op}', _queue(_op))
+
+
+def _delete_records(conn, model, condition, now):
+    fields = TRACKED[model]
+    rows = conn.execute(select(model.id, *(getattr(model, field) for field in fields)).where(condition))
+    return [{'entity': model.__name__, 'entity_id': row[0], 'op': 'delete',
+             'changes': {field: [_json_value(value), None] for field, value in zip(fields, row[1:])},
+             'created_at': now}
+            for row in rows]
+
+
+def deletion_records(conn, client_ids=(), invoice_ids=()):
+    """Delete records for these clients and invoices and for the invoices, line items
+    and payments the database deletes with them; read them before the delete."""
+    now = _utcnow()
+    invoices = or_(Invoice.id.in_(invoice_ids), Invoice.client_id.in_(client_ids))
+    invoice_select = select(Invoice.id).where(invoices)
+    return (_delete_records(conn, InvoiceItem, InvoiceItem.invoice_id.in_(invoice_select), now)
+            + _delete_records(conn, Payment, Payment.invoice_id.in_(invoice_select), now)
+            + _delete_records(conn, Invoice, invoices, now)
+            + _delete_records(conn, Client, Client.id.in_(client_ids), now))
+
+
+def record_deletes(conn, client_ids=(), invoice_ids=()):
+    """Append delete records for clients and invoices about to be deleted with Core statements."""
+    records = deletion_records(conn, client_ids, invoice_ids)
+    if records:
+        conn.execute(insert(ChangeRecord.__table__), records)
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_deleted(session, flush_context, instances):
+    # A deleted row's old values can no longer be loaded once the flush has run
+    for obj in session.deleted:
+        for field in TRACKED.get(type(obj), ()):
+            getattr(obj, field)
+    # Children the database deletes along with a client or invoice
+    # (passive_deletes) are never loaded, so record them from the table
+    client_ids = [obj.id for obj in session.deleted if isinstance(obj, Client)]
+    invoice_ids = [obj.id for obj in session.deleted if isinstance(obj, Invoice)]
+    if client_ids or invoice_ids:
+        in_session = {(type(obj).__name__, obj.id) for obj in session.deleted}
+        records = [r for r in deletion_records(session.connection(), client_ids, invoice_ids)
+                   if (r['entity'], r['entity_id']) not in in_session]
+        session.info.setdefault('change_feed', []).extend(records)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_changes(session, flush_context):
+    records = session.info.pop('change_feed', None)
+    if records:
+        session.connection().execute(insert(ChangeRecord.__table__), records)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changes(session, previous_transaction):
+    session.info.pop('change_feed', None)
+
+
+def record_inserts(conn, model, rows):
+    """Append insert records for rows written with Core statements; each row needs ``id``."""
+    now = _utcnow()
+    conn.execute(insert(ChangeRecord.__table__), [
+        {'entity': model.__name__, 'entity_id': row['id'], 'op': 'insert',
+         'changes': {field: [None, _json_value(row.get(field))] for field in TRACKED[model]}, 'created_at': now}
+        for row in rows
+    ])
+
+
+# ---------- Consuming ----------
+
+def _open_gaps(gaps, now):
+    """Skipped id ranges still re-checked for late records."""
+    expiry = now - timedelta(seconds=current_app.config['CHANGE_FEED_GAP_SECONDS'])
+    return [gap for gap in gaps or () if datetime.fromisoformat(gap[2]) > expiry]
+
+
+def _without(gaps, ids):
+    remaining = []
+    for first, last, skipped_at in gaps:
+        start = first
+        for found in sorted(i for i in ids if first <= i <= last):
+            if start < found:
+                remaining.append([start, found - 1, skipped_at])
+            start = found + 1
+        if start <= last:
+            remaining.append([start, last, skipped_at])
+    return remaining
+
+
+class FeedConsumer:
+    """Reads the change feed in id order from an offset stored under ``name``.
+
+    Ids are assigned at flush, not at commit, so a record can become visible
+    after records with higher ids. ``fetch()`` waits up to
+    CHANGE_FEED_SETTLE_SECONDS at a gap in the ids, then moves past it but
+    keeps the skipped ids with the offset and re-checks them for
+    CHANGE_FEED_GAP_SECONDS, delivering any record that turns up late (out
+    of id order). Keep that window above the longest transaction that
+    writes to the feed, such as a bulk issue or an archive batch; gaps left
+    by rolled-back transactions simply expire.
+    """
+
+    def __init__(self, name, batch_size=None):
+        self.name = name
+        self.batch_size = batch_size or current_app.config['CHANGE_FEED_BATCH_SIZE']
+        self._fetched = None
+
+    def position(self):
+        offset = db.session.get(FeedOffset, self.name)
+        return offset.position if offset else 0
+
+    def fetch(self):
+        """The next batch of changes: late records from skipped gaps, then those after the offset."""
+        offset = db.session.get(FeedOffset, self.name)
+        position = offset.position if offset else 0
+        now = _utcnow()
+        settle = now - timedelta(seconds=current_app.config['CHANGE_FEED_SETTLE_SECONDS'])
+        gaps = _open_gaps(offset.gaps if offset else None, now)
+        records = select(ChangeRecord.id, ChangeRecord.entity, ChangeRecord.entity_id, ChangeRecord.op,
+                         ChangeRecord.changes, ChangeRecord.created_at).order_by(ChangeRecord.id)
+
+        changes = []
+        if gaps:
+            late = db.session.execute(
+                records.where(or_(*(ChangeRecord.id.between(first, last) for first, last, _ in gaps)))
+                .limit(self.batch_size))
+            changes = [Change(*row) for row in late]
+            gaps = _without(gaps, {change.id for change in changes})
+
+        expected = position + 1
+        if len(changes) < self.batch_size:
+            rows = db.session.execute(records.where(ChangeRecord.id > position).limit(self.batch_size - len(changes)))
+            for row in rows:
+                if row.id != expected:
+                    # A young gap may be a transaction about to commit; wait for it
+                    if _as_utc(row.created_at) > settle:
+                        break
+                    gaps.append([expected, row.id - 1, now.isoformat()])
+                changes.append(Change(*row))
+                expected = row.id + 1
+        self._fetched = (expected - 1, gaps)
+        return changes
+
+    def ack(self, changes):
+        """Store the offset and open gaps after the last fetch; committed with the caller's transaction."""
+        if not changes:
+            return
+        position, gaps = self._fetched
+        updated = db.session.execute(
+            update(FeedOffset).where(FeedOffset.consumer == self.name)
+            .values(position=position, gaps=gaps, updated_at=_utcnow())
+        ).rowcount
+        if not updated:
+            db.session.add(FeedOffset(consumer=self.name, position=position, gaps=gaps, updated_at=_utcnow()))
+            db.session.flush()
+
+    def run(self, handler):
+        """Pass every pending batch to ``handler(changes)``, committing after each; returns the count."""
+        count = 0
+        while True:
+            changes = self.fetch()
+            if not changes:
+                return count
+            try:
+                handler(changes)
+                self.ack(changes)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            count += len(changes)
+
+
+def prune_changes():
+    """Delete records every consumer has read, and any older than the retention period."""
+    now = _utcnow()
+    cutoff = now - timedelta(days=current_app.config['CHANGE_FEED_RETENTION_DAYS'])
+    # Keep records a consumer may still receive late from an open gap
+    read_by_all = min((min([offset.position] + [first - 1 for first, _, _ in _open_gaps(offset.gaps, now)])
+                       for offset in FeedOffset.query), default=None)
+    condition = ChangeRecord.created_at < cutoff
+    if read_by_all is not None:
+        condition = or_(condition, ChangeRecord.id <= read_by_all)
+    deleted = db.session.execute(delete(ChangeRecord).where(condition)).rowcount
+    db.session.commit()
+    return f'deleted {deleted} change records'
+
+
+# ---------- CLI ----------
+
+changes_cli = AppGroup('changes', help='Change feed consumers.')
+
+
+@changes_cli.command('status')
+def status_command():
+    """Show each consumer's offset and how many records it has yet to read."""
+    latest = db.session.execute(select(func.max(ChangeRecord.id))).scalar() or 0
+    click.echo(f'latest record: {latest}')
+    now = _utcnow()
+    for offset in FeedOffset.query.order_by(FeedOffset.consumer):
+        pending = db.session.execute(
+            select(func.count()).select_from(ChangeRecord).where(ChangeRecord.id > offset.position)).scalar()
+        awaited = sum(last - first + 1 for first, last, _ in _open_gaps(offset.gaps, now))
+        seen = f'{offset.updated_at:%Y-%m-%d %H:%M}' if offset.updated_at else 'never'
+        click.echo(f'{offset.consumer:20} at {offset.position} ({pending} behind, {awaited} skipped ids awaited, '
+                   f'last ack {seen})')
+
+
+@changes_cli.command('tail')
+@click.option('--after', type=int, default=0, help='Only records with a higher id.')
+@click.option('--limit', type=int, default=50)
+def tail_command(after, limit):
+    """Print change records."""
+    records = ChangeRecord.query.filter(ChangeRecord.id > after).order_by(ChangeRecord.id).limit(limit)
+    for r in records:
+        click.echo(f'{r.id} {r.created_at:%Y-%m-%d %H:%M:%S} {r.op} {r.entity} {r.entity_id} {r.changes}')
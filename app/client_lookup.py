@@ -0,0 +1,64 @@
+"""Column-projected client lookups for the client pickers on the invoice
+and bulk issue forms.
+
+The pickers never load ``Client`` entities: they search through
+``/clients/lookup`` as the user types and the invoice form only preloads
+the selected client, so the page costs the same however many clients there
+are. Searches match the start of the first or last name (or "first last")
+with range predicates on ``lower(...)``, which the
+``ix_client_*_name_lower`` indexes serve directly.
+"""
+from collections import namedtuple
+
+from sqlalchemy import and_, func, or_, select
+
+from app import db
+from app.models import Client
+
+COLUMNS = (Client.id, Client.first_name, Client.last_name, Client.vehicle_year, Client.vehicle_make,
+           Client.vehicle_model, Client.vehicle_trim)
+
+
+class ClientChoice(namedtuple('ClientChoice', [c.key for c in COLUMNS])):
+    __slots__ = ()
+
+    @property
+    def full_name(self):
+        return f'{self.first_name} {self.last_name}'
+
+    @property
+    def vehicle_display(self):
+        return Client.format_vehicle(self.vehicle_year, self.vehicle_make, self.vehicle_model, self.vehicle_trim)
+
+    def as_json(self):
+        return {'id': self.id, 'full_name': self.full_name, 'vehicle': self.vehicle_display}
+
+
+def _starts_with(column, prefix):
+    # lower(column) LIKE 'prefix%' written as a range, so it can use the index
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(func.lower(column) >= prefix, func.lower(column) < upper)
+
+
+def search(query, limit=20):
+    """Clients whose first or last name starts with `query`, by last name."""
+    words = query.lower().split()
+    if not words:
+        return []
+    first, rest = words[0], ' '.join(words[1:])
+    if rest:
+        condition = or_(and_(_starts_with(Client.first_name, first), _starts_with(Client.last_name, rest)),
+                        and_(_starts_with(Client.last_name, first), _starts_with(Client.first_name, rest)))
+    else:
+        condition = or_(_starts_with(Client.last_name, first), _starts_with(Client.first_name, first))
+    rows = db.session.execute(
+        select(*COLUMNS).where(condition).order_by(Client.last_name, Client.first_name).limit(limit))
+    return [ClientChoice(*row) for row in rows]
+
+
+def get(client_id):
+    """The picker's preselected client, or None."""
+    if not client_id:
+        return None
+    row = db.session.execute(select(*COLUMNS).where(Client.id == client_id)).first()
+    return ClientChoice(*row) if row else None
@@ -0,0 +1,373 @@
+"""Dump the whole database to one file and load it into another.
+
+For moving the embedded SQLite database into PostgreSQL, or a production
+snapshot onto a laptop::
+
+    flask --app wsgi data dump crm.dump.gz
+    DATABASE_URL=postgresql://... flask --app wsgi db upgrade
+    DATABASE_URL=postgresql://... flask --app wsgi data load crm.dump.gz
+
+A dump is gzip-compressed JSON lines: a header with the schema revision,
+then for every table (in foreign key order) a line naming its columns, one
+JSON array per row in primary key order, and a footer with the row count
+and checksum. Rows are read with a server-side cursor and written as they
+arrive, and loaded ``--batch-size`` rows at a time, so memory stays flat
+however big the tables are.
+
+``load`` expects a database migrated to the dump's revision with empty
+tables (``--replace`` empties them first). Everything loads in one
+transaction: ``COPY ... FROM STDIN`` on PostgreSQL and batched
+``executemany`` inserts elsewhere. Before committing, each table's row
+count and checksum are read back from the database and compared with the
+dump, and the id sequences (PostgreSQL, and SQLite's AUTOINCREMENT
+tables) are moved past the loaded ids, archived ones included. Any difference rolls the whole load back.
+
+Rows are written with plain Core statements, so the rollups and change
+feed are copied as they were rather than rebuilt.
+"""
+import gzip
+import hashlib
+import io
+import json
+import time
+from datetime import date, datetime
+
+import click
+from alembic.migration import MigrationContext
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, literal, select, text
+
+from app import db
+
+FORMAT = 'rickifast-dump'
+VERSION = 1
+BATCH_SIZE = 5000
+_MODULUS = 2 ** 256
+
+
+class DumpError(click.ClickException):
+    pass
+
+
+def _tables():
+    return db.metadata.sorted_tables
+
+
+# ---------- row encoding ----------
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'cannot dump {type(value).__name__} values')
+
+
+def encode_row(row):
+    """The dump line for a row: a compact JSON array, dates as ISO strings."""
+    return json.dumps(list(row), default=_json_default, separators=(',', ':'), ensure_ascii=False)
+
+
+class Checksum:
+    """Row count and an order-independent digest of a table's encoded rows.
+
+    Digests are summed rather than chained so the result does not depend on
+    how each database collates text primary keys.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.total = 0
+
+    def add(self, line):
+        self.rows += 1
+        self.total = (self.total + int.from_bytes(hashlib.sha256(line.encode()).digest(), 'big')) % _MODULUS
+
+    @property
+    def hexdigest(self):
+        return f'{self.total:064x}'
+
+
+def _decoders(table, columns):
+    decoders = []
+    for name in columns:
+        column_type = table.c[name].type
+        if isinstance(column_type, db.DateTime):
+            decoders.append(datetime.fromisoformat)
+        elif isinstance(column_type, db.Date):
+            decoders.append(date.fromisoformat)
+        else:
+            decoders.append(None)
+    return decoders
+
+
+def _decode(row, decoders):
+    return [value if decode is None or value is None else decode(value) for value, decode in zip(row, decoders)]
+
+
+def _copy_field(value, is_json):
+    """A value in PostgreSQL's COPY text format."""
+    if value is None:
+        return '\\N'
+    if is_json:
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+# ---------- reading a database ----------
+
+def _stream(conn, table, columns, batch_size):
+    """Encoded rows of `table` in primary key order, fetched `batch_size` at a time."""
+    stmt = select(*(table.c[name] for name in columns)).order_by(*table.primary_key.columns)
+    for row in conn.execution_options(yield_per=batch_size).execute(stmt):
+        yield encode_row(row)
+
+
+def _revision(conn):
+    return MigrationContext.configure(conn).get_current_revision()
+
+
+def dump(conn, fh, batch_size=BATCH_SIZE, progress=None):
+    """Write every table to the text stream `fh`. Returns {table: Checksum}."""
+    fh.write(json.dumps({'format': FORMAT, 'version': VERSION, 'revision': _revision(conn),
+                         'dialect': conn.dialect.name,
+                         'created_at': datetime.now().astimezone().isoformat(timespec='seconds')}) + '\n')
+    sums = {}
+    for table in _tables():
+        started = time.perf_counter()
+        columns = [c.name for c in table.columns]
+        fh.write(json.dumps({'table': table.name, 'columns': columns}) + '\n')
+        checksum = sums[table.name] = Checksum()
+        for line in _stream(conn, table, columns, batch_size):
+            checksum.add(line)
+            fh.write(line + '\n')
+        fh.write(json.dumps({'end': table.name, 'rows': checksum.rows, 'checksum': checksum.hexdigest}) + '\n')
+        if progress:
+            progress(table.name, checksum.rows, time.perf_counter() - started)
+    fh.write(json.dumps({'end': None, 'tables': len(sums)}) + '\n')
+    return sums
+
+
+# ---------- reading a dump ----------
+
+class _Reader:
+    """Walks a dump: `header`, then `blocks()` yields (table name, columns), whose rows `batches()` reads."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.header = self._marker()
+        if self.header.get('format') != FORMAT:
+            raise DumpError('Not a data dump.')
+        if self.header.get('version') != VERSION:
+            raise DumpError(f"Unsupported dump version {self.header.get('version')}.")
+        self.footer = None
+
+    def _line(self):
+        try:
+            line = self.fh.readline()
+        except EOFError:
+            line = ''
+        if not line.endswith('\n'):
+            raise DumpError('The dump is truncated.')
+        return line[:-1]
+
+    def _marker(self):
+        line = self._line()
+        if not line.startswith('{'):
+            raise DumpError('The dump is corrupt: expected a table marker.')
+        return json.loads(line)
+
+    def blocks(self):
+        while True:
+            marker = self._marker()
+            if marker.get('end', '') is None:
+                return
+            if 'table' not in marker:
+                raise DumpError('The dump is corrupt: expected a table header.')
+            self.footer = None
+            yield marker['table'], marker['columns']
+            if self.footer is None:
+                raise DumpError(f"Rows of {marker['table']} were not read.")
+
+    def batches(self, table_name, batch_size):
+        """Decoded JSON rows of the current table, `batch_size` at a time; then sets `footer`."""
+        checksum = Checksum()
+        batch = []
+        while True:
+            line = self._line()
+            if line.startswith('{'):
+                break
+            checksum.add(line)
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        footer = json.loads(line)
+        if footer.get('end') != table_name:
+            raise DumpError(f'The dump is corrupt: {table_name} has no footer.')
+        if (footer['rows'], footer['checksum']) != (checksum.rows, checksum.hexdigest):
+            raise DumpError(f'The dump is corrupt: {table_name} does not match its checksum.')
+        self.footer = footer
+
+
+# ---------- writing a database ----------
+
+def _copy(conn, table, columns, rows):
+    """Send rows to PostgreSQL with one COPY."""
+    json_columns = [isinstance(table.c[name].type, db.JSON) for name in columns]
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_field(value, is_json) for value, is_json in zip(row, json_columns)))
+        buffer.write('\n')
+    buffer.seek(0)
+    quote = conn.dialect.identifier_preparer.quote
+    sql = f"COPY {quote(table.name)} ({', '.join(quote(c) for c in columns)}) FROM STDIN"
+    with conn.connection.driver_connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+
+
+def _insert(conn, table, columns, rows):
+    conn.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def _writer(conn):
+    if conn.dialect.name == 'postgresql' and conn.dialect.driver == 'psycopg2':
+        return _copy
+    return _insert
+
+
+def _non_empty(conn):
+    return [table.name for table in _tables()
+            if conn.execute(select(literal(1)).select_from(table).limit(1)).first() is not None]
+
+
+def _empty_tables(conn):
+    tables = list(reversed(_tables()))
+    if conn.dialect.name == 'postgresql':
+        quote = conn.dialect.identifier_preparer.format_table
+        conn.execute(text(f"TRUNCATE {', '.join(quote(t) for t in tables)} RESTART IDENTITY"))
+    else:
+        for table in tables:
+            conn.execute(table.delete())
+
+
+def _highest_id(conn, table, column):
+    """The largest id the table has handed out, counting its archived rows."""
+    archive = db.metadata.tables.get(f'archived_{table.name}')
+    ids = select(column.label('id'))
+    if archive is not None:
+        ids = ids.union_all(select(archive.c[column.name]))
+    return conn.execute(select(func.max(ids.subquery().c.id))).scalar()
+
+
+def _reset_sequences(conn):
+    """Move the id sequences past the loaded ids, archived ones included."""
+    sqlite = conn.dialect.name == 'sqlite'
+    if not sqlite and conn.dialect.name != 'postgresql':
+        return
+    for table in _tables():
+        pk = list(table.primary_key.columns)
+        if len(pk) != 1 or not isinstance(pk[0].type, db.Integer):
+            continue
+        if sqlite:
+            if not table.dialect_options['sqlite']['autoincrement']:
+                continue
+            highest = _highest_id(conn, table, pk[0])
+            if highest is not None:
+                conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+                conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                             {'name': table.name, 'seq': highest})
+            continue
+        sequence = conn.execute(select(func.pg_get_serial_sequence(
+            conn.dialect.identifier_preparer.format_table(table), pk[0].name))).scalar()
+        if sequence is None:
+            continue
+        highest = _highest_id(conn, table, pk[0])
+        conn.execute(select(func.setval(sequence, (highest or 0) + 1, False)))
+
+
+def _verify(conn, table, columns, footer, batch_size):
+    checksum = Checksum()
+    for line in _stream(conn, table, columns, batch_size):
+        checksum.add(line)
+    if checksum.rows != footer['rows']:
+        raise DumpError(f"{table.name}: loaded {checksum.rows} rows, the dump has {footer['rows']}.")
+    if checksum.hexdigest != footer['checksum']:
+        raise DumpError(f'{table.name}: the loaded rows do not match the dump checksum.')
+
+
+def load(conn, fh, batch_size=BATCH_SIZE, replace=False, progress=None):
+    """Load the dump in the text stream `fh` inside `conn`'s transaction. Returns {table: rows}."""
+    reader = _Reader(fh)
+    revision = _revision(conn)
+    if reader.header['revision'] != revision:
+        raise DumpError(f"The dump is at revision {reader.header['revision']} but this database is at "
+                        f'{revision}; run `flask db upgrade` to the same revision first.')
+    if replace:
+        _empty_tables(conn)
+    else:
+        occupied = _non_empty(conn)
+        if occupied:
+            raise DumpError(f"Refusing to load into non-empty tables ({', '.join(occupied)}); "
+                            'use --replace to empty them first.')
+
+    tables = {table.name: table for table in _tables()}
+    write = _writer(conn)
+    loaded = {}
+    for name, columns in reader.blocks():
+        table = tables.get(name)
+        if table is None:
+            raise DumpError(f'This database has no {name} table.')
+        missing = [c for c in columns if c not in table.c]
+        if missing:
+            raise DumpError(f"{name} has no column {', '.join(missing)}.")
+        started = time.perf_counter()
+        decoders = _decoders(table, columns)
+        for batch in reader.batches(name, batch_size):
+            write(conn, table, columns, [_decode(row, decoders) for row in batch])
+        _verify(conn, table, columns, reader.footer, batch_size)
+        loaded[name] = reader.footer['rows']
+        if progress:
+            progress(name, loaded[name], time.perf_counter() - started)
+    missing = [name for name in tables if name not in loaded]
+    if missing:
+        raise DumpError(f"The dump has no rows for {', '.join(missing)}.")
+    _reset_sequences(conn)
+    return loaded
+
+
+# ---------- CLI ----------
+
+data_cli = AppGroup('data', help='Dump the database to a file and load it into another.')
+
+
+def _report(name, rows, seconds):
+    click.echo(f'{name:24} {rows:>10} rows {seconds:>8.2f}s')
+
+
+@data_cli.command('dump')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--batch-size', type=int, default=BATCH_SIZE, show_default=True, help='Rows fetched at a time.')
+def dump_command(path, batch_size):
+    """Write every table to PATH (gzip-compressed JSON lines)."""
+    started = time.perf_counter()
+    with db.engine.connect() as conn, gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as fh:
+        sums = dump(conn, fh, batch_size=batch_size, progress=_report)
+    click.echo(f'Dumped {sum(s.rows for s in sums.values())} rows from {len(sums)} tables '
+               f'in {time.perf_counter() - started:.1f}s.')
+
+
+@data_cli.command('load')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, default=BATCH_SIZE, show_default=True, help='Rows written at a time.')
+@click.option('--replace', is_flag=True, help='Empty every table before loading.')
+def load_command(path, batch_size, replace):
+    """Load a dump into this (migrated, empty) database and check it."""
+    started = time.perf_counter()
+    with db.engine.begin() as conn, gzip.open(path, 'rt', encoding='utf-8') as fh:
+        loaded = load(conn, fh, batch_size=batch_size, replace=replace, progress=_report)
+    click.echo(f'Loaded and verified {sum(loaded.values())} rows in {len(loaded)} tables '
+               f'in {time.perf_counter() - started:.1f}s.')
@@ -0,0 +1,60 @@
+"""Outbox for invoice emails sent in the background.
+
+Bulk invoice issue queues one ``QueuedEmail`` per invoice in the same
+transaction that creates the invoices; the ``send-invoice-emails``
+maintenance job (run by the ``worker`` process) sends them, marks draft
+invoices as sent like the Email Invoice button does, and retries failures
+up to ``EMAIL_QUEUE_MAX_ATTEMPTS`` times.
+"""
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import insert, select
+
+from app import db
+from app.email_utils import send_invoice_email
+from app.loading import profile
+from app.models import Client, Invoice, QueuedEmail
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def queue_invoice_emails(conn, invoice_ids):
+    """Queue an email to each invoice's client; returns how many invoices had no address to send to."""
+    rows = conn.execute(
+        select(Invoice.id, Client.email).join(Client, Client.id == Invoice.client_id)
+        .where(Invoice.id.in_(invoice_ids))
+    ).all()
+    queued = [{'invoice_id': inv_id, 'recipients': email.strip(), 'queued_at': _utcnow(), 'attempts': 0}
+              for inv_id, email in rows if email and email.strip()]
+    if queued:
+        conn.execute(insert(QueuedEmail), queued)
+    return len(rows) - len(queued)
+
+
+def send_queued():
+    """Send pending invoice emails, oldest first."""
+    max_attempts = current_app.config['EMAIL_QUEUE_MAX_ATTEMPTS']
+    pending = QueuedEmail.query.filter(QueuedEmail.sent_at.is_(None), QueuedEmail.attempts < max_attempts) \
+        .order_by(QueuedEmail.id).limit(current_app.config['EMAIL_QUEUE_BATCH_SIZE']).all()
+    sent = failed = 0
+    for email in pending:
+        invoice = db.session.get(Invoice, email.invoice_id, options=profile('invoice.pdf'))
+        email.attempts += 1
+        if invoice is None:
+            email.last_error = 'invoice deleted'
+            email.attempts = max_attempts
+            failed += 1
+        elif send_invoice_email(invoice, email.recipients, include_pdf=True):
+            email.sent_at = _utcnow()
+            if invoice.status == 'draft':
+                invoice.status = 'sent'
+            sent += 1
+        else:
+            email.last_error = 'send failed, see the application log'
+            failed += 1
+        db.session.commit()
+    return f'sent {sent} invoice emails, {failed} failed'
+
@@ -5,6 +5,7 @@ from email.mime.base import MIMEBase
 from email.mime.image import MIMEImage
 from email import encoders
 from flask import current_app
+from app.metrics import PDF_RENDER_SECONDS, SMTP_FAILURES, SMTP_SEND_SECONDS
 
 
 def send_email(to_email, subject, html_body, attachments=None, inline_images=None):
@@ -57,17 +58,19 @@ def send_email(to_email, subject, html_body, attachments=None, inline_images=Non
             msg.attach(part)
 
     try:
-        server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-        server.ehlo()
-        if app.config['MAIL_USE_TLS']:
-            server.starttls()
+        with SMTP_SEND_SECONDS.time():
+            server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
             server.ehlo()
-        server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        server.sendmail(msg['From'], recipients, msg.as_string())
-        server.quit()
+            if app.config['MAIL_USE_TLS']:
+                server.starttls()
+                server.ehlo()
+            server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+            server.sendmail(msg['From'], recipients, msg.as_string())
+            server.quit()
         return True
     except Exception as e:
-        current_app.logger.error(f'Failed to send email to {recipients}: {e}')
+        SMTP_FAILURES.inc()
+        current_app.logger.error(f'Failed to send email to {recipients}: {e}', extra={'recipients': recipients})
         return False
 
 
@@ -117,6 +120,7 @@ def send_invite_email(email, invite_url, invited_by):
 # Invoice emailing
 # ---------------------------------------------------------------------------
 
+@PDF_RENDER_SECONDS.time()
 def generate_invoice_pdf(invoice):
     """Generate a PDF for an invoice using fpdf2. Returns bytes."""
     from fpdf import FPDF
@@ -432,7 +436,7 @@ def send_invoice_email(invoice, recipient_emails, include_pdf=True):
                 'content': pdf_bytes,
             })
         except Exception as e:
-            current_app.logger.error(f'PDF generation failed: {e}')
+            current_app.logger.exception(f'PDF generation failed: {e}', extra={'invoice_number': invoice.invoice_number})
 
     # Generate logo PNG for inline CID embedding
     inline_images = []
@@ -440,7 +444,7 @@ def send_invoice_email(invoice, recipient_emails, include_pdf=True):
         logo_png = _generate_logo_png()
         inline_images.append({'cid': 'logo', 'content': logo_png, 'filename': 'logo.png'})
     except Exception as e:
-        current_app.logger.error(f'Logo generation failed: {e}')
+        current_app.logger.exception(f'Logo generation failed: {e}')
 
     return send_email(recipient_emails, subject, html_body,
                       attachments=attachments or None,
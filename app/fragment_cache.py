@@ -0,0 +1,115 @@
+"""Template fragment cache: ``{% cache name, key... %} ... {% endcache %}``.
+
+The rendered body is stored under ``name`` plus the key values, so keys
+must include everything the fragment depends on, typically the entity id
+and its ``updated_at`` (item and payment writes bump their invoice's
+``updated_at``). Never cache fragments that contain a CSRF token or
+per-user content.
+
+Storage is pluggable through ``FRAGMENT_CACHE_BACKEND``: ``memory`` (a
+per-process LRU of ``FRAGMENT_CACHE_SIZE`` entries, the default), ``null``
+(caching off), or the import path of a class with ``get``/``set``/``clear``.
+Hits and misses are counted in the ``template_fragment_cache_total`` metric.
+"""
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from werkzeug.utils import import_string
+
+from app.metrics import FRAGMENT_CACHE_REQUESTS
+
+
+class MemoryBackend:
+    """Thread-safe LRU of rendered fragments."""
+
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class FragmentCache:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+
+    def render(self, name, key, render):
+        full_key = f'{name}:{key}'
+        value = self.backend.get(full_key)
+        if value is not None:
+            FRAGMENT_CACHE_REQUESTS.labels(name, 'hit').inc()
+            return Markup(value)
+        FRAGMENT_CACHE_REQUESTS.labels(name, 'miss').inc()
+        value = render()
+        self.backend.set(full_key, str(value))
+        return Markup(value)
+
+    def clear(self):
+        self.backend.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        key = []
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [name, nodes.List(key)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, name, key, caller):
+        return fragment_cache.render(name, '|'.join(map(repr, key)), caller)
+
+
+def _make_backend(app):
+    backend = app.config['FRAGMENT_CACHE_BACKEND']
+    if backend == 'memory':
+        return MemoryBackend(app.config['FRAGMENT_CACHE_SIZE'])
+    if backend == 'null':
+        return NullBackend()
+    return import_string(backend)()
+
+
+def init_app(app):
+    """Register the {% cache %} tag; must run before ``app.jinja_env`` is first used."""
+    fragment_cache.backend = _make_backend(app)
+    extensions = list(app.jinja_options.get('extensions', ())) + [FragmentCacheExtension]
+    app.jinja_options = {**app.jinja_options, 'extensions': extensions}
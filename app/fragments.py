@@ -0,0 +1,70 @@
+"""Server side of the navigation layer in ``base.html``.
+
+Requests carrying ``X-Fragment: main`` get only the page's ``<main>``
+content (plus its title and flashed messages) from any template that
+extends ``base.html``. Such responses are marked with ``X-Fragment``,
+``X-Layout`` (who the nav was rendered for, so a login/logout falls back
+to a full load) and ``X-Section`` (which nav link to highlight).
+
+The browser sends the layout it is showing as ``X-Layout`` too. When that
+no longer matches, a GET is answered with an empty non-fragment response
+without running the view, and other methods render no flashed messages,
+so the messages are left for the full page load that follows.
+"""
+from flask import g, get_flashed_messages, has_request_context, request
+from flask_login import current_user
+
+HEADER = 'X-Fragment'
+
+
+def wants_fragment():
+    return has_request_context() and request.headers.get(HEADER) == 'main'
+
+
+def layout_key():
+    if not current_user.is_authenticated:
+        return 'anon'
+    return f'{current_user.id}:{int(bool(current_user.is_admin))}'
+
+
+def nav_section():
+    endpoint = request.endpoint or ''
+    if endpoint.startswith('auth.admin'):
+        return 'admin'
+    return request.blueprint or endpoint
+
+
+def _layout_changed():
+    return request.headers.get('X-Layout', layout_key()) != layout_key()
+
+
+def _mark_fragment():
+    g.fragment_rendered = True
+    return ''
+
+
+def _fragment_flashes():
+    return [] if _layout_changed() else get_flashed_messages(with_categories=True)
+
+
+def init_app(app):
+    @app.context_processor
+    def _fragment_context():
+        return {'fragment_request': wants_fragment(), 'mark_fragment': _mark_fragment,
+                'fragment_flashes': _fragment_flashes, 'layout_key': layout_key}
+
+    @app.before_request
+    def _skip_stale_layout():
+        # The browser will load the page in full anyway
+        if wants_fragment() and request.method in ('GET', 'HEAD') and _layout_changed():
+            return '', 200, {'X-Layout': layout_key()}
+
+    @app.after_request
+    def _fragment_headers(response):
+        if response.mimetype == 'text/html':
+            response.vary.add(HEADER)
+        if g.pop('fragment_rendered', False):
+            response.headers[HEADER] = 'main'
+            response.headers['X-Layout'] = layout_key()
+            response.headers['X-Section'] = nav_section()
+        return response
@@ -0,0 +1,207 @@
+"""Index advisor: EXPLAIN the queries each page issues and flag full table scans.
+
+Meant for a seeded development or staging database, not production::
+
+    flask --app wsgi indexes advise --seed 2000
+
+Every GET route is requested through the test client while the SQL it
+issues is captured; each distinct SELECT is then run through EXPLAIN
+(``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN (FORMAT JSON)`` on Postgres)
+and sequential scans are reported per route.
+"""
+import random
+import sys
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from sqlalchemy import event, insert
+
+from app import db
+from app.models import Client, Invoice, InvoiceItem, Payment, User
+from app.rollups import rebuild
+
+# Query-string variants worth checking in addition to the bare URL
+EXTRA_QUERIES = {
+    'clients.index': [{'q': 'son'}],
+    'clients.search_api': [{'q': 'son'}],
+    'invoices.index': [{'status': 'overdue'}, {'status': 'paid'}],
+    'payments.index': [{'method': 'cash'}],
+}
+SKIP_ENDPOINTS = {'static', 'metrics', 'readyz', 'auth.logout'}
+MAKES = ['Honda', 'Subaru', 'Ford', 'Toyota', 'BMW', 'Chevrolet', 'Nissan', 'Volkswagen']
+
+
+def seed(count):
+    """Insert `count` synthetic clients with invoices, items and payments."""
+    rng = random.Random(1734)
+    today = date.today()
+    db.session.execute(insert(Client), [
+        {'first_name': f'Client{i}', 'last_name': f'Lastname{i % 997:03d}son',
+         'email': f'client{i}@example.com', 'phone': f'(512) 555-{i % 10000:04d}',
+         'vehicle_year': str(2005 + i % 20), 'vehicle_make': MAKES[i % len(MAKES)],
+         'vehicle_model': 'Model', 'notes': 'Seeded by the index advisor.'}
+        for i in range(count)
+    ])
+    client_ids = [row.id for row in db.session.query(Client.id)]
+    offset = db.session.query(db.func.coalesce(db.func.max(Invoice.id), 0)).scalar()
+    db.session.execute(insert(Invoice), [
+        {'client_id': cid, 'invoice_number': f'SEED-{offset + n + 1:07d}',
+         'status': rng.choice(['draft', 'sent', 'sent', 'sent']),
+         'due_date': today + timedelta(days=rng.randint(-120, 30)), 'tax_rate': 0.0825}
+        for n, cid in enumerate(cid for cid in client_ids for _ in range(2))
+    ])
+    invoice_ids = [row.id for row in db.session.query(Invoice.id)]
+    db.session.execute(insert(InvoiceItem), [
+        {'invoice_id': iid, 'description': desc, 'quantity': 1,
+         'unit_price': rng.choice([150, 350, 600, 900]), 'taxable': desc != 'Dyno Session'}
+        for iid in invoice_ids for desc in ('Dyno Session', 'Stage 1 ECU Tune')
+    ])
+    db.session.execute(insert(Payment), [
+        {'invoice_id': iid, 'amount': rng.choice([100, 250, 500]),
+         'payment_date': today - timedelta(days=rng.randint(0, 365)),
+         'method': rng.choice(['cash', 'check', 'zelle', 'venmo', 'card'])}
+        for iid in invoice_ids if rng.random() < 0.6
+    ])
+    if User.query.first() is None:
+        user = User(username='advisor', email='advisor@example.com', is_admin=True)
+        user.set_password('advisor-password')
+        db.session.add(user)
+    db.session.commit()
+    # The bulk inserts above bypass the flush hooks that maintain the rollups
+    rebuild()
+
+
+def _sample_urls(app):
+    first_ids = {
+        'clients': db.session.query(db.func.min(Client.id)).scalar(),
+        'invoices': db.session.query(db.func.min(Invoice.id)).scalar(),
+        'payments': db.session.query(db.func.min(Payment.id)).scalar(),
+    }
+    with app.test_request_context():
+        for rule in app.url_map.iter_rules():
+            if 'GET' not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+                continue
+            args = set(rule.arguments)
+            if args - {'id'}:
+                continue
+            values = {}
+            if 'id' in args:
+                sample_id = first_ids.get(rule.endpoint.split('.')[0])
+                if sample_id is None:
+                    continue
+                values['id'] = sample_id
+            for query in [{}] + EXTRA_QUERIES.get(rule.endpoint, []):
+                yield rule.endpoint, url_for(rule.endpoint, **values, **query)
+
+
+def capture_route_queries(app):
+    """Request every sample URL as a logged-in admin; return {url: [(engine, statement, params)]}."""
+    captured = OrderedDict()
+    current = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if current.get('url') and not executemany:
+            captured[current['url']].append((conn.engine, statement, parameters))
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        user = User.query.order_by(User.is_admin.desc(), User.id).first()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+        for endpoint, url in list(_sample_urls(app)):
+            current['url'] = url
+            captured[url] = []
+            response = client.get(url)
+            if response.status_code >= 400:
+                click.echo(f'  ! {url} returned {response.status_code}', err=True)
+        current.clear()
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+    return captured
+
+
+def _sqlite_scans(conn, statement, parameters):
+    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in rows
+            if row[-1].startswith('SCAN ') and 'USING' not in row[-1] and 'CONSTANT ROW' not in row[-1]]
+
+
+def _postgres_scans(conn, statement, parameters):
+    plan = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    plan = plan[0]['Plan'] if isinstance(plan, list) else plan
+    scans = []
+
+    def walk(node):
+        if node.get('Node Type') == 'Seq Scan':
+            scans.append(f"Seq Scan on {node.get('Relation Name')} (rows={node.get('Plan Rows')})")
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan)
+    return scans
+
+
+def explain_scans(engine, statement, parameters):
+    """Return the sequential scans in the plan for one captured statement."""
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            return _sqlite_scans(conn, statement, parameters)
+        if engine.dialect.name == 'postgresql':
+            return _postgres_scans(conn, statement, parameters)
+    return []
+
+
+def advise(app):
+    """Return {url: [(statement, [scan, ...])]} for statements that scan whole tables."""
+    findings = OrderedDict()
+    for url, queries in capture_route_queries(app).items():
+        seen = set()
+        for engine, statement, parameters in queries:
+            if not statement.lstrip().upper().startswith('SELECT') or statement in seen:
+                continue
+            seen.add(statement)
+            scans = explain_scans(engine, statement, parameters)
+            if scans:
+                findings.setdefault(url, []).append((statement, scans))
+    return findings
+
+
+# ---------- CLI ----------
+
+indexes_cli = AppGroup('indexes', help='Index tooling.')
+
+
+@indexes_cli.command('advise')
+@click.option('--seed', 'seed_count', type=int, default=0,
+              help='Seed this many synthetic clients first (only into an empty database).')
+@click.option('--fail', is_flag=True, help='Exit non-zero when a sequential scan is found.')
+def advise_command(seed_count, fail):
+    """EXPLAIN every route's queries and flag sequential scans."""
+    if seed_count:
+        if Client.query.first() is not None:
+            raise click.ClickException('Refusing to seed a database that already has clients.')
+        seed(seed_count)
+        click.echo(f'Seeded {seed_count} clients.')
+    if User.query.first() is None:
+        raise click.ClickException('The advisor needs at least one user; run with --seed or create_admin.py.')
+
+    findings = advise(current_app._get_current_object())
+    for url, statements in findings.items():
+        click.echo(f'\n{url}')
+        for statement, scans in statements:
+            click.echo(f'  {" ".join(statement.split())[:160]}')
+            for scan in scans:
+                click.echo(f'    -> {scan}')
+
+    total = sum(len(s) for s in findings.values())
+    click.echo(f'\n{total} statement(s) with sequential scans across {len(findings)} route(s).')
+    if fail and total:
+        sys.exit(1)
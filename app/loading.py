@@ -0,0 +1,75 @@
+"""Named relationship loading profiles, and a count of ORM rows loaded per request.
+
+Relationships are lazy by default. Each route names the profile that
+matches what its template renders::
+
+    Invoice.query.options(*profile('invoice.list'))
+    db.get_or_404(Invoice, id, options=profile('invoice.detail'))
+
+With ``RAISE_ON_LAZY_LOAD`` (on whenever TESTING is), every profile ends
+in ``raiseload('*')``, so touching a relationship the profile did not plan
+for raises instead of quietly issuing one query per row.
+"""
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from app.metrics import ORM_ROWS_LOADED
+from app.models import ArchivedInvoice, Client, Invoice
+
+
+def _invoice_children():
+    # Pages that list an invoice's items and payments; totals are summed from them
+    return [selectinload(Invoice.items), selectinload(Invoice.payments)]
+
+
+PROFILES = {
+    'client.detail': lambda: [joinedload(Client.stats)],
+    # Invoice rows only; money figures come from app.totals.load_totals()
+    'invoice.totals': lambda: [],
+    'invoice.list': lambda: [joinedload(Invoice.client)],
+    'invoice.detail': lambda: [joinedload(Invoice.client)] + _invoice_children(),
+    'invoice.pdf': lambda: [joinedload(Invoice.client)] + _invoice_children(),
+    'invoice.edit': lambda: [selectinload(Invoice.items)],
+    # Archive rows; invoices.archive adds its own contains_eager(ArchivedInvoice.client)
+    'archive.list': lambda: [],
+    'archive.detail': lambda: [joinedload(ArchivedInvoice.client), selectinload(ArchivedInvoice.items),
+                               selectinload(ArchivedInvoice.payments)],
+}
+
+
+def profile(name):
+    """Loader options for the named profile."""
+    options = PROFILES[name]()
+    if current_app.config['RAISE_ON_LAZY_LOAD'] or current_app.testing:
+        options.append(raiseload('*'))
+    return options
+
+
+def _count_load(target, context):
+    if has_request_context() and 'rows_loaded' in g:
+        g.rows_loaded[type(target).__name__] += 1
+
+
+def init_app(app, db):
+    """Count ORM instances loaded per request into ORM_ROWS_LOADED and log heavy requests."""
+    event.listen(db.Model, 'load', _count_load, propagate=True)
+
+    @app.before_request
+    def _start_count():
+        g.rows_loaded = Counter()
+
+    @app.after_request
+    def _record_count(response):
+        counts = g.pop('rows_loaded', None)
+        if counts is None:
+            return response
+        total = sum(counts.values())
+        ORM_ROWS_LOADED.labels(request.endpoint or 'unmatched').observe(total)
+        if total > app.config['ROWS_LOADED_WARN']:
+            app.logger.warning(f'{request.method} {request.path} loaded {total} ORM rows: {dict(counts)}')
+        if app.debug or app.testing:
+            response.headers['X-Rows-Loaded'] = str(total)
+        return response
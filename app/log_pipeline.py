@@ -0,0 +1,202 @@
+"""Structured, non-blocking logging.
+
+Every record (the app's and, through the root logger, the libraries') is
+put on a bounded in-memory queue by a ``QueueHandler`` and written to
+stderr by a ``QueueListener`` thread, so a slow log sink never holds up a
+request. If the sink falls ``LOG_QUEUE_SIZE`` records behind, new records
+are dropped and counted in ``log_records_dropped_total`` instead of making
+the request wait.
+
+With ``LOG_FORMAT=json`` (the default) each record is written as one JSON
+object carrying the request id, user id, endpoint, method and path of the
+request that logged it, plus any ``extra={...}`` fields. Every request
+gets an id, taken from a well-formed incoming ``X-Request-ID`` header or
+generated, and echoes it in its response. With ``LOG_REQUESTS`` each
+request also logs one record with its status and duration; static files
+and ``/metrics`` are logged at DEBUG.
+
+DEBUG records are sampled per request: a request keeps all of its debug
+records with probability ``LOG_DEBUG_SAMPLE_RATE`` and drops them
+otherwise, so sampled requests can still be followed end to end.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+from app.metrics import LOG_RECORDS_DROPPED
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+# Requests logged at DEBUG rather than INFO
+_QUIET_ENDPOINTS = frozenset(['static', 'metrics'])
+_plain = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tags records with the current request and samples DEBUG records.
+
+    Runs on the logging thread, before the record is queued, because the
+    request context is not available on the listener thread.
+    """
+
+    def __init__(self, debug_sample_rate):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record):
+        in_request = has_request_context()
+        if in_request:
+            # The user Flask-Login already loaded; never load it just to log
+            user = g.get('_login_user')
+            for key, value in (('request_id', g.get('request_id')), ('user_id', getattr(user, 'id', None)),
+                               ('endpoint', request.endpoint), ('method', request.method),
+                               ('path', request.path)):
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        if record.levelno > logging.DEBUG:
+            return True
+        if not in_request:
+            return random.random() < self.debug_sample_rate
+        if 'log_debug_sampled' not in g:
+            g.log_debug_sampled = random.random() < self.debug_sample_rate
+        return g.log_debug_sampled
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records rather than wait for a full queue."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record):
+        # Render the message and traceback while the arguments are still
+        # live; the listener thread does the formatting and the I/O
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # On shutdown wait for room, so everything already queued is written
+        self.queue.put(self._sentinel)
+
+
+class Pipeline:
+    """The queue, its handler and the listener thread writing to `sink`."""
+
+    def __init__(self, sink, size):
+        self.sink = sink
+        self.size = size
+        self.handler = NonBlockingQueueHandler(queue.Queue(size))
+        self.listener = None
+        self.start()
+
+    def start(self):
+        self.listener = DrainingQueueListener(self.handler.queue, self.sink, respect_handler_level=True)
+        self.listener.start()
+
+    def restart_after_fork(self):
+        # Only the forking thread survives a fork, so a forked worker needs
+        # its own queue and listener
+        self.handler.queue = queue.Queue(self.size)
+        self.start()
+
+    def stop(self):
+        """Write out what is still queued and stop the listener."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+_pipeline = None
+
+
+def _formatter(name):
+    if name == 'json':
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s',
+                             defaults={'request_id': '-'})
+
+
+def init_app(app):
+    """Route all logging through the queue and tag records with the request they belong to."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = Pipeline(logging.StreamHandler(sys.stderr), app.config['LOG_QUEUE_SIZE'])
+        logging.getLogger().addHandler(_pipeline.handler)
+        os.register_at_fork(after_in_child=_pipeline.restart_after_fork)
+        atexit.register(_pipeline.stop)
+    _pipeline.sink.setFormatter(_formatter(app.config['LOG_FORMAT']))
+    for old in list(_pipeline.handler.filters):
+        _pipeline.handler.removeFilter(old)
+    _pipeline.handler.addFilter(RequestContextFilter(app.config['LOG_DEBUG_SAMPLE_RATE']))
+
+    level = app.config['LOG_LEVEL'].upper()
+    logging.getLogger().setLevel(level)
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(level)
+
+    @app.before_request
+    def _assign_request_id():
+        supplied = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = supplied if _REQUEST_ID.match(supplied) else uuid.uuid4().hex
+        g.log_request_start = time.perf_counter()
+
+    @app.after_request
+    def _log_request(response):
+        request_id = g.get('request_id')
+        if request_id is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id
+        if app.config['LOG_REQUESTS']:
+            duration = time.perf_counter() - g.pop('log_request_start')
+            level = logging.DEBUG if request.endpoint in _QUIET_ENDPOINTS else logging.INFO
+            app.logger.log(level, f'{request.method} {request.path} {response.status_code}',
+                           extra={'status': response.status_code, 'duration_ms': round(duration * 1000, 1),
+                                  'response_bytes': response.content_length})
+        return response
@@ -0,0 +1,235 @@
+"""Scheduled database housekeeping.
+
+Run the scheduler as its own process (see ``Procfile``)::
+
+    flask --app wsgi maintenance schedule
+
+or run a single job by hand, e.g. after a large import::
+
+    flask --app wsgi maintenance run refresh-stats
+
+Each job takes a lease on its ``MaintenanceJob`` row with a conditional
+UPDATE, so any number of schedulers can run without a job ever executing
+twice at the same time.
+"""
+import os
+import socket
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, or_, text, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.archive import archive_job
+from app.catalog import usage_job
+from app.change_feed import prune_changes
+from app.email_queue import send_queued
+from app.sqlite_profile import checkpoint
+from app.metrics import MAINTENANCE_JOB_SECONDS
+from app.models import InviteCode, MaintenanceJob, PasswordResetToken
+
+Job = namedtuple('Job', ['func', 'interval', 'lease'])
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt is not None and dt.tzinfo is None else dt
+
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# ---------- Jobs ----------
+
+def _delete_in_batches(model, condition, batch_size):
+    deleted = 0
+    while True:
+        ids = [row.id for row in db.session.query(model.id).filter(condition).limit(batch_size)]
+        if not ids:
+            return deleted
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+
+def prune_tokens():
+    """Delete used and expired reset tokens and invite codes."""
+    cutoff = _utcnow() - timedelta(days=current_app.config['TOKEN_RETENTION_DAYS'])
+    batch_size = current_app.config['MAINTENANCE_BATCH_SIZE']
+    deleted = 0
+    for model in (PasswordResetToken, InviteCode):
+        condition = or_(model.expires_at < cutoff,
+                        and_(model.used.is_(True), model.created_at < cutoff))
+        deleted += _delete_in_batches(model, condition, batch_size)
+
+    if deleted >= current_app.config['STATS_REFRESH_THRESHOLD']:
+        refresh_stats()
+    return f'deleted {deleted} tokens'
+
+
+def refresh_stats():
+    """Refresh the query planner's statistics."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        db.session.execute(text('ANALYZE'))
+    elif dialect == 'sqlite':
+        db.session.execute(text('PRAGMA optimize'))
+    db.session.commit()
+    return f'statistics refreshed ({dialect})'
+
+
+def compact():
+    """Reclaim space left behind by deleted rows."""
+    dialect = db.engine.dialect.name
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if dialect == 'postgresql':
+            for table in (PasswordResetToken.__table__, InviteCode.__table__):
+                conn.execute(text(f'VACUUM (ANALYZE) {conn.dialect.identifier_preparer.format_table(table)}'))
+            return 'vacuumed token tables'
+        if dialect == 'sqlite':
+            free = conn.execute(text('PRAGMA freelist_count')).scalar()
+            pages = conn.execute(text('PRAGMA page_count')).scalar() or 1
+            if free / pages < current_app.config['SQLITE_VACUUM_FREE_RATIO']:
+                return f'skipped ({free}/{pages} pages free)'
+            conn.execute(text('VACUUM'))
+            return f'vacuumed ({free} free pages reclaimed)'
+    return f'nothing to do for {dialect}'
+
+
+def sqlite_checkpoint():
+    """Checkpoint SQLite's write-ahead log and run PRAGMA optimize."""
+    dialect = db.engine.dialect.name
+    if dialect != 'sqlite':
+        return f'nothing to do for {dialect}'
+    with db.engine.connect() as conn:
+        return checkpoint(conn)
+
+
+JOBS = {
+    'prune-tokens': Job(prune_tokens, interval=timedelta(hours=1), lease=timedelta(minutes=30)),
+    'refresh-stats': Job(refresh_stats, interval=timedelta(days=1), lease=timedelta(minutes=30)),
+    'compact': Job(compact, interval=timedelta(days=7), lease=timedelta(hours=2)),
+    'sqlite-checkpoint': Job(sqlite_checkpoint, interval=timedelta(minutes=15), lease=timedelta(minutes=5)),
+    'prune-changes': Job(prune_changes, interval=timedelta(hours=1), lease=timedelta(minutes=30)),
+    'archive-invoices': Job(archive_job, interval=timedelta(days=1), lease=timedelta(hours=2)),
+    'send-invoice-emails': Job(send_queued, interval=timedelta(minutes=1), lease=timedelta(minutes=15)),
+    'catalog-usage': Job(usage_job, interval=timedelta(minutes=5), lease=timedelta(minutes=15)),
+}
+
+
+# ---------- Locking and scheduling ----------
+
+def _acquire(name, owner, lease):
+    if db.session.get(MaintenanceJob, name) is None:
+        db.session.add(MaintenanceJob(name=name))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
+    now = _utcnow()
+    result = db.session.execute(
+        update(MaintenanceJob)
+        .where(MaintenanceJob.name == name,
+               or_(MaintenanceJob.locked_until.is_(None), MaintenanceJob.locked_until < now))
+        .values(locked_by=owner, locked_until=now + lease, last_started_at=now)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _release(name, owner, duration, result):
+    db.session.execute(
+        update(MaintenanceJob)
+        .where(MaintenanceJob.name == name, MaintenanceJob.locked_by == owner)
+        .values(locked_by=None, locked_until=None, last_finished_at=_utcnow(),
+                last_duration=duration, last_result=result[:200])
+    )
+    db.session.commit()
+
+
+def run_job(name, owner=None):
+    """Run one job under its lock. Returns the job's result, or None if another worker holds it."""
+    job = JOBS[name]
+    owner = owner or _owner()
+    if not _acquire(name, owner, job.lease):
+        current_app.logger.info(f'Maintenance job {name} is already running elsewhere, skipping')
+        return None
+
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        result = job.func()
+    except Exception as e:
+        db.session.rollback()
+        outcome = 'error'
+        result = f'failed: {e}'
+        current_app.logger.exception(f'Maintenance job {name} failed')
+    duration = time.perf_counter() - start
+
+    MAINTENANCE_JOB_SECONDS.labels(name, outcome).observe(duration)
+    _release(name, owner, duration, result)
+    current_app.logger.info(f'Maintenance job {name} finished in {duration:.2f}s: {result}')
+    return result
+
+
+def run_pending(owner=None):
+    """Run every job whose interval has elapsed since it last finished."""
+    now = _utcnow()
+    ran = []
+    for name, job in JOBS.items():
+        state = db.session.get(MaintenanceJob, name)
+        last = _as_utc(state.last_finished_at) if state else None
+        if last is None or last + job.interval <= now:
+            if run_job(name, owner) is not None:
+                ran.append(name)
+    return ran
+
+
+# ---------- CLI ----------
+
+maintenance_cli = AppGroup('maintenance', help='Database housekeeping jobs.')
+
+
+@maintenance_cli.command('run')
+@click.argument('job', type=click.Choice(list(JOBS)))
+def run_command(job):
+    """Run a single job now."""
+    result = run_job(job)
+    click.echo(result if result is not None else f'{job} is locked by another worker.')
+
+
+@maintenance_cli.command('schedule')
+@click.option('--once', is_flag=True, help='Run due jobs once and exit.')
+def schedule_command(once):
+    """Run due jobs in a loop (use as a separate worker process)."""
+    owner = _owner()
+    poll = current_app.config['MAINTENANCE_POLL_SECONDS']
+    while True:
+        run_pending(owner)
+        db.session.remove()
+        if once:
+            return
+        time.sleep(poll)
+
+
+@maintenance_cli.command('status')
+def status_command():
+    """Show when each job last ran."""
+    for name in JOBS:
+        state = db.session.get(MaintenanceJob, name)
+        if state is None or state.last_finished_at is None:
+            click.echo(f'{name:20} never run')
+            continue
+        lock = f' (locked by {state.locked_by})' if state.locked_by else ''
+        click.echo(f'{name:20} {state.last_finished_at:%Y-%m-%d %H:%M} '
+                   f'{state.last_duration:.2f}s {state.last_result}{lock}')
@@ -0,0 +1,233 @@
+"""Opt-in per-request memory profiling.
+
+With ``MEMORY_PROFILE_ENABLED`` set, a ``MEMORY_PROFILE_SAMPLE_RATE``
+fraction of requests run under ``tracemalloc``: the request's peak traced
+memory and the source lines holding the most memory when it finished are
+recorded, along with the worker's RSS before and after. Requests peaking
+above ``MEMORY_PROFILE_PEAK_WARN_MB`` are flagged, logged and, when
+``MEMORY_PROFILE_DIR`` is set, appended to ``memory-<pid>.jsonl`` there.
+
+tracemalloc traces the whole process, so a request is only sampled when
+it is the only one in flight in its worker, and its report is dropped if
+another request arrives before it is done; under load few requests
+qualify. Tracing runs until the response has been sent, so memory used
+while generating a streamed body is counted.
+Reports and per-endpoint summaries are kept in memory per worker and
+shown to admins at ``/admin/memory``. Worker RSS is exported as the
+``worker_rss_bytes`` gauge on every request, sampled or not.
+"""
+import json
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+from flask import g, request
+
+from app.metrics import REQUEST_PEAK_MEMORY_BYTES, WORKER_RSS_BYTES
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# Allocations made by the profiler itself and the import machinery
+_IGNORED = (tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'))
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclass
+class Report:
+    endpoint: str
+    method: str
+    path: str
+    status: int
+    at: str
+    seconds: float
+    peak_bytes: int
+    retained_bytes: int
+    rss_before: int
+    rss_after: int
+    flagged: bool
+    top: list = field(default_factory=list)  # [(file:line, bytes, allocations)]
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    flagged: int = 0
+    peak_max: int = 0
+    peak_total: int = 0
+    rss_growth: int = 0
+
+    @property
+    def peak_mean(self):
+        return self.peak_total // self.requests if self.requests else 0
+
+
+class MemoryProfiler:
+    """Samples requests with tracemalloc and keeps the latest reports for this worker."""
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.frames = 1
+        self.top = 10
+        self.warn_bytes = 0
+        self.dump_dir = None
+        self.reports = deque(maxlen=200)
+        self.endpoints = {}
+        self.first_rss = None  # RSS when this worker profiled its first request
+        self._busy = threading.Lock()  # held while a request is traced
+        self._stats_lock = threading.Lock()
+        self._active_lock = threading.Lock()
+        self._active = 0  # requests in flight, until their responses are sent
+        self._overlapped = False  # another request arrived during the traced one
+
+    def configure(self, config):
+        self.sample_rate = config['MEMORY_PROFILE_SAMPLE_RATE']
+        self.frames = config['MEMORY_PROFILE_FRAMES']
+        self.top = config['MEMORY_PROFILE_TOP']
+        self.warn_bytes = int(config['MEMORY_PROFILE_PEAK_WARN_MB'] * 1024 * 1024)
+        self.dump_dir = config['MEMORY_PROFILE_DIR']
+        self.reports = deque(maxlen=config['MEMORY_PROFILE_KEEP'])
+
+    def enter(self):
+        with self._active_lock:
+            self._active += 1
+            if self._busy.locked():
+                self._overlapped = True
+
+    def leave(self):
+        with self._active_lock:
+            self._active -= 1
+
+    def start(self):
+        """Begin tracing this request if it is sampled and the only one in flight."""
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return False
+        with self._active_lock:
+            alone = self._active == 1
+            self._overlapped = False
+        if not alone or tracemalloc.is_tracing():
+            # Traced by someone else (e.g. python -X tracemalloc); leave it alone
+            self._busy.release()
+            return False
+        g.memory_profile = (time.perf_counter(), rss_bytes())
+        if self.first_rss is None:
+            self.first_rss = g.memory_profile[1]
+        tracemalloc.start(self.frames)
+        return True
+
+    def finish(self, trace, endpoint, method, path, status):
+        """Stop tracing and record the report, or return None if another request overlapped it.
+
+        Runs once the response has been sent, outside the request context.
+        """
+        started, rss_before = trace
+        try:
+            if self._overlapped:
+                return None
+            retained, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        finally:
+            tracemalloc.stop()
+            self._busy.release()
+        top = [(f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}', stat.size, stat.count)
+               for stat in snapshot.statistics('lineno')[:self.top]]
+        report = Report(
+            endpoint=endpoint, method=method, path=path,
+            status=status, at=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            seconds=round(time.perf_counter() - started, 4), peak_bytes=peak, retained_bytes=retained,
+            rss_before=rss_before, rss_after=rss_bytes(), flagged=bool(self.warn_bytes) and peak > self.warn_bytes,
+            top=top,
+        )
+        self.record(report)
+        return report
+
+    def abandon(self):
+        """Stop tracing a request that ended with an unhandled error."""
+        if g.pop('memory_profile', None) is not None:
+            tracemalloc.stop()
+            self._busy.release()
+
+    def record(self, report):
+        REQUEST_PEAK_MEMORY_BYTES.labels(report.endpoint).observe(report.peak_bytes)
+        with self._stats_lock:
+            self.reports.append(report)
+            stats = self.endpoints.setdefault(report.endpoint, EndpointStats())
+            stats.requests += 1
+            stats.flagged += report.flagged
+            stats.peak_max = max(stats.peak_max, report.peak_bytes)
+            stats.peak_total += report.peak_bytes
+            stats.rss_growth += report.rss_after - report.rss_before
+        if report.flagged and self.dump_dir:
+            self.dump(report)
+
+    def dump(self, report):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        with open(os.path.join(self.dump_dir, f'memory-{os.getpid()}.jsonl'), 'a') as f:
+            f.write(json.dumps(asdict(report)) + '\n')
+
+    def snapshot(self):
+        """(per-endpoint stats sorted by worst peak, latest reports first) for the admin page."""
+        with self._stats_lock:
+            endpoints = sorted(self.endpoints.items(), key=lambda item: item[1].peak_max, reverse=True)
+            return endpoints, list(reversed(self.reports))
+
+    def reset(self):
+        with self._stats_lock:
+            self.reports.clear()
+            self.endpoints.clear()
+
+
+profiler = MemoryProfiler()
+
+
+def init_app(app):
+    if not app.config['MEMORY_PROFILE_ENABLED']:
+        return
+    profiler.configure(app.config)
+
+    @app.before_request
+    def _start_profile():
+        profiler.enter()
+        g.memory_profile_active = True
+        profiler.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        WORKER_RSS_BYTES.set(rss_bytes())
+        if 'memory_profile' in g:
+            trace = g.pop('memory_profile')
+            endpoint, method, path = request.endpoint or 'unmatched', request.method, request.path
+
+            def finish():
+                report = profiler.finish(trace, endpoint, method, path, response.status_code)
+                if report is not None and report.flagged:
+                    sites = ', '.join(f'{site} {size // 1024} KiB' for site, size, _ in report.top[:3])
+                    app.logger.warning(f'{method} {path} peaked at {report.peak_bytes / 1048576:.1f} MiB traced '
+                                       f'memory (RSS {report.rss_after / 1048576:.0f} MiB): {sites}')
+
+            response.call_on_close(finish)
+        if g.pop('memory_profile_active', False):
+            response.call_on_close(profiler.leave)
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request does not run when the view raised; stop tracing anyway
+        profiler.abandon()
+        if g.pop('memory_profile_active', False):
+            profiler.leave()
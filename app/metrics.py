@@ -0,0 +1,183 @@
+"""Prometheus metrics for requests, the DB pool, SMTP, PDF rendering, logins, memory and logging.
+
+When ``PROMETHEUS_MULTIPROC_DIR`` is set (see ``gunicorn.conf.py``) every
+worker writes its samples to that directory and ``/metrics`` aggregates them,
+so the numbers from all gunicorn workers add up.
+
+``/metrics`` requires ``Authorization: Bearer <METRICS_TOKEN>``. Without a
+token configured it only answers requests from a loopback address (a
+scraper sidecar on the same host) and is a 404 for everyone else.
+"""
+import hmac
+import ipaddress
+import os
+import time
+
+from flask import Response, abort, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint and status.',
+    ['endpoint', 'method', 'status'],
+)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', 'SQL statement execution time.',
+    ['bind', 'statement'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled connection.',
+    ['bind'],
+    buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out', 'Connections currently checked out of the pool.',
+    ['bind'], multiprocess_mode='livesum',
+)
+DB_POOL_OVERFLOW = Gauge(
+    'db_pool_overflow', 'Connections open beyond pool_size.',
+    ['bind'], multiprocess_mode='livesum',
+)
+PDF_RENDER_SECONDS = Histogram(
+    'invoice_pdf_render_seconds', 'Time spent rendering invoice PDFs.',
+)
+SMTP_SEND_SECONDS = Histogram(
+    'smtp_send_duration_seconds', 'Time spent delivering a message over SMTP.',
+    buckets=(.1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+)
+SMTP_FAILURES = Counter(
+    'smtp_send_failures_total', 'SMTP deliveries that raised an error.',
+)
+PASSWORD_VERIFY_SECONDS = Histogram(
+    'password_verify_duration_seconds', 'Time spent verifying password hashes.',
+    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+ORM_ROWS_LOADED = Histogram(
+    'orm_rows_loaded', 'ORM instances loaded per request.',
+    ['endpoint'],
+    buckets=(0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+FRAGMENT_CACHE_REQUESTS = Counter(
+    'template_fragment_cache_total', 'Template fragment cache lookups.',
+    ['fragment', 'result'],
+)
+REQUEST_PEAK_MEMORY_BYTES = Histogram(
+    'request_peak_memory_bytes', 'Peak traced memory of requests sampled by the memory profiler.',
+    ['endpoint'],
+    buckets=(1 << 20, 2 << 20, 5 << 20, 10 << 20, 25 << 20, 50 << 20, 100 << 20, 250 << 20),
+)
+WORKER_RSS_BYTES = Gauge(
+    'worker_rss_bytes', 'Resident memory of the worker process (with the memory profiler on).',
+    multiprocess_mode='liveall',
+)
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full.',
+)
+MAINTENANCE_JOB_SECONDS = Histogram(
+    'maintenance_job_duration_seconds', 'Duration of scheduled maintenance jobs.',
+    ['job', 'outcome'],
+    buckets=(.1, .5, 1, 5, 15, 60, 300, 900),
+)
+
+
+def _statement_kind(statement):
+    parts = statement.lstrip().split(None, 1)
+    return parts[0].upper() if parts else 'OTHER'
+
+
+def _instrument_pool(pool, bind):
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(bind).observe(time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+
+def _pool_stats(pool, bind):
+    if hasattr(pool, 'checkedout'):
+        DB_POOL_CHECKED_OUT.labels(bind).set(pool.checkedout())
+    if hasattr(pool, 'overflow'):
+        DB_POOL_OVERFLOW.labels(bind).set(max(pool.overflow(), 0))
+
+
+def instrument_engine(engine, bind='default'):
+    """Attach query timing and pool gauges to a SQLAlchemy engine."""
+    _instrument_pool(engine.pool, bind)
+
+    @event.listens_for(engine, 'engine_disposed')
+    def on_disposed(engine):
+        # dispose() swaps in a fresh pool, so wrap that one too
+        _instrument_pool(engine.pool, bind)
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _pool_stats(engine.pool, bind)
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        _pool_stats(engine.pool, bind)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['query_start'].pop()
+        DB_QUERY_SECONDS.labels(bind, _statement_kind(statement)).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, 'handle_error')
+    def on_error(context):
+        if context.connection is not None and context.connection.info.get('query_start'):
+            context.connection.info['query_start'].pop()
+
+
+def _is_loopback(address):
+    try:
+        return ipaddress.ip_address(address or '').is_loopback
+    except ValueError:
+        return False
+
+
+def init_app(app, db):
+    """Register request timing, engine instrumentation and the /metrics endpoint."""
+    with app.app_context():
+        for bind, engine in db.engines.items():
+            instrument_engine(engine, bind or 'default')
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            REQUEST_LATENCY.labels(
+                request.endpoint or 'unmatched', request.method, str(response.status_code),
+            ).observe(time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+            if not hmac.compare_digest(supplied.encode(), token.encode()):
+                abort(401)
+        elif not _is_loopback(request.remote_addr):
+            abort(404)
+
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -1,3 +1,9 @@
-from app.models.models import User, Client, Invoice, InvoiceItem, Payment, PasswordResetToken, InviteCode
+from app.models.models import (User, Client, Invoice, InvoiceItem, Payment, PasswordResetToken, InviteCode,
+                               MaintenanceJob, DailyRevenue, DailyReceivable, ClientStats,
+                               ChangeRecord, FeedOffset, ArchivedInvoice, ArchivedInvoiceItem,
+                               ArchivedPayment, InvoiceTemplate, QueuedEmail, CatalogItem)
 
-__all__ = ['User', 'Client', 'Invoice', 'InvoiceItem', 'Payment', 'PasswordResetToken', 'InviteCode']
+__all__ = ['User', 'Client', 'Invoice', 'InvoiceItem', 'Payment', 'PasswordResetToken', 'InviteCode',
+           'MaintenanceJob', 'DailyRevenue', 'DailyReceivable', 'ClientStats', 'ChangeRecord', 'FeedOffset',
+           'ArchivedInvoice', 'ArchivedInvoiceItem', 'ArchivedPayment', 'InvoiceTemplate', 'QueuedEmail',
+           'CatalogItem']
@@ -1,13 +1,40 @@
+from collections import namedtuple
 from datetime import datetime, date, timezone
 import secrets
 from app import db, login_manager
+from app.metrics import PASSWORD_VERIFY_SECONDS
+from app.user_cache import Principal, user_cache
 from flask_login import UserMixin
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session, object_session
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
 @login_manager.user_loader
 def load_user(id):
-    return db.session.get(User, int(id))
+    principal = user_cache.get(int(id))
+    if principal is None:
+        user = db.session.get(User, int(id))
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        user_cache.put(principal)
+    return principal
+
+
+def confirm_admin(principal):
+    """Whether `principal` is still an admin according to the database.
+
+    The cached principal can be up to USER_CACHE_TTL seconds stale in
+    workers other than the one that changed the user, so admin routes ask
+    the database; a deleted or demoted user is dropped from the cache.
+    """
+    if not principal.is_authenticated:
+        return False
+    is_admin = db.session.execute(select(User.is_admin).where(User.id == principal.id)).scalar()
+    if bool(is_admin) != principal.is_admin:
+        user_cache.invalidate(principal.id)
+    return bool(is_admin)
 
 
 class User(UserMixin, db.Model):
@@ -17,16 +44,39 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256))
     is_admin = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        # Case-insensitive login lookup: lower(username) = :username
+        db.Index('ix_user_username_lower', db.func.lower(username)),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        with PASSWORD_VERIFY_SECONDS.time():
+            return check_password_hash(self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
 
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_user_invalidation(mapper, connection, target):
+    object_session(target).info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_users', None)
+
+
 class PasswordResetToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -63,6 +113,12 @@ class InviteCode(db.Model):
 
     invited_by = db.relationship('User', backref='sent_invites')
 
+    __table_args__ = (
+        # Pending invites list on the admin page
+        db.Index('ix_invite_code_pending', 'created_at',
+                 postgresql_where=db.text('used = false'), sqlite_where=db.text('used = 0')),
+    )
+
     @staticmethod
     def generate(email, invited_by_user, hours=48):
         from datetime import timedelta
@@ -78,6 +134,20 @@ class InviteCode(db.Model):
         return not self.used and datetime.now(timezone.utc) < self.expires_at
 
 
+class MaintenanceJob(db.Model):
+    """Lock and last-run bookkeeping for one scheduled maintenance job."""
+    name = db.Column(db.String(64), primary_key=True)
+    locked_by = db.Column(db.String(128))
+    locked_until = db.Column(db.DateTime)
+    last_started_at = db.Column(db.DateTime)
+    last_finished_at = db.Column(db.DateTime)
+    last_duration = db.Column(db.Float)
+    last_result = db.Column(db.String(200))
+
+    def __repr__(self):
+        return f'<MaintenanceJob {self.name}>'
+
+
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(100), nullable=False)
@@ -91,10 +161,20 @@ class Client(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
-                           onupdate=lambda: datetime.now(timezone.utc))
+                           onupdate=lambda: datetime.now(timezone.utc), index=True)
+
+    __table_args__ = (
+        # Prefix search for the client picker (app/client_lookup.py)
+        db.Index('ix_client_last_name_lower', db.func.lower(last_name)),
+        db.Index('ix_client_first_name_lower', db.func.lower(first_name)),
+    )
 
-    invoices = db.relationship('Invoice', backref='client', lazy='selectin',
-                               cascade='all, delete-orphan')
+    # Relationships load lazily; routes choose what to eager-load via app/loading.py.
+    # The database deletes a client's invoices (ON DELETE CASCADE), so deleting
+    # a client never loads them
+    invoices = db.relationship('Invoice', backref='client',
+                               cascade='all, delete-orphan', passive_deletes=True)
+    stats = db.relationship('ClientStats', uselist=False, viewonly=True)
 
     @property
     def full_name(self):
@@ -102,17 +182,31 @@ class Client(db.Model):
 
     @property
     def vehicle_display(self):
-        parts = [p for p in [self.vehicle_year, self.vehicle_make,
-                             self.vehicle_model, self.vehicle_trim] if p]
+        return self.format_vehicle(self.vehicle_year, self.vehicle_make, self.vehicle_model, self.vehicle_trim)
+
+    @staticmethod
+    def format_vehicle(*parts):
+        parts = [p for p in parts if p]
         return ' '.join(parts) if parts else 'No vehicle'
 
     def __repr__(self):
         return f'<Client {self.full_name}>'
 
 
+class InvoiceTotals(namedtuple('InvoiceTotals', ['subtotal', 'taxable', 'tax', 'total', 'paid', 'balance'])):
+    """An invoice's money figures; see Invoice.totals() and app/totals.py."""
+    __slots__ = ()
+
+    @classmethod
+    def compute(cls, subtotal, taxable, tax_rate, paid):
+        tax = taxable * (tax_rate or 0)
+        total = subtotal + tax
+        return cls(subtotal, taxable, tax, total, paid, total - paid)
+
+
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False, index=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id', ondelete='CASCADE'), nullable=False, index=True)
     invoice_number = db.Column(db.String(20), unique=True, nullable=False)
     status = db.Column(db.String(20), default='draft', index=True)  # draft or sent
     due_date = db.Column(db.Date)
@@ -120,51 +214,80 @@ class Invoice(db.Model):
     tax_rate = db.Column(db.Float, default=0.0825)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
-                           onupdate=lambda: datetime.now(timezone.utc))
+                           onupdate=lambda: datetime.now(timezone.utc), index=True)
 
     items = db.relationship('InvoiceItem', backref='invoice',
-                            cascade='all, delete-orphan', lazy='selectin')
+                            cascade='all, delete-orphan', passive_deletes=True)
     payments = db.relationship('Payment', backref='invoice',
-                               cascade='all, delete-orphan', lazy='selectin',
+                               cascade='all, delete-orphan', passive_deletes=True,
                                order_by='Payment.payment_date.desc()')
 
+    __table_args__ = (
+        # Overdue lookups filter on status and compare due_date
+        db.Index('ix_invoice_status_due_date', 'status', 'due_date'),
+        # Never reuse ids on SQLite; archived invoices keep theirs
+        {'sqlite_autoincrement': True},
+    )
+
     @staticmethod
     def generate_number():
-        last = Invoice.query.order_by(Invoice.id.desc()).first()
-        next_num = (last.id + 1) if last else 1
-        return f'INV-{next_num:04d}'
+        # Archived invoices keep their ids and numbers, so count them too
+        last_id = max(db.session.query(db.func.max(Invoice.id)).scalar() or 0,
+                      db.session.query(db.func.max(ArchivedInvoice.id)).scalar() or 0)
+        return f'INV-{last_id + 1:04d}'
+
+    def totals(self):
+        """InvoiceTotals, memoised on the instance until it is expired.
+
+        Batch-loaded by app.totals.load_totals() on list pages; otherwise
+        summed from the loaded items and payments.
+        """
+        totals = self.__dict__.get('_totals')
+        if totals is None:
+            subtotal = sum(item.amount for item in self.items)
+            taxable = sum(item.amount for item in self.items if item.taxable)
+            paid = sum(p.amount for p in self.payments)
+            totals = self._totals = InvoiceTotals.compute(subtotal, taxable, self.tax_rate, paid)
+        return totals
 
     def calculate_subtotal(self):
-        return sum(item.amount for item in self.items)
+        return self.totals().subtotal
 
     def calculate_tax(self):
-        return sum(item.amount for item in self.items if item.taxable) * self.tax_rate
+        return self.totals().tax
 
     def calculate_total(self):
-        return self.calculate_subtotal() + self.calculate_tax()
+        return self.totals().total
 
     def calculate_paid(self):
-        return sum(p.amount for p in self.payments)
+        return self.totals().paid
 
     def calculate_balance(self):
-        return self.calculate_total() - self.calculate_paid()
+        return self.totals().balance
 
     def get_status(self):
-        total = self.calculate_total()
-        paid = self.calculate_paid()
-        if self.status == 'draft':
+        return self.display_status(self.status, self.due_date, self.calculate_total(), self.calculate_paid())
+
+    def days_overdue(self):
+        return self.overdue_days(self.due_date)
+
+    # Shared with the list rows in app/read_models.py
+    @staticmethod
+    def display_status(status, due_date, total, paid):
+        if status == 'draft':
             return 'draft'
         if total > 0 and paid >= total:
             return 'paid'
         if paid > 0:
             return 'partial'
-        if self.due_date and self.due_date < date.today():
+        if due_date and due_date < date.today():
             return 'overdue'
         return 'sent'
 
-    def days_overdue(self):
-        if self.due_date and self.due_date < date.today():
-            return (date.today() - self.due_date).days
+    @staticmethod
+    def overdue_days(due_date):
+        if due_date and due_date < date.today():
+            return (date.today() - due_date).days
         return 0
 
     def __repr__(self):
@@ -173,12 +296,15 @@ class Invoice(db.Model):
 
 class InvoiceItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, index=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id', ondelete='CASCADE'), nullable=False, index=True)
     description = db.Column(db.String(200), nullable=False)
     quantity = db.Column(db.Float, default=1)
     unit_price = db.Column(db.Float, nullable=False)
     taxable = db.Column(db.Boolean, default=False)
 
+    # Never reuse ids on SQLite; archived line items keep theirs
+    __table_args__ = {'sqlite_autoincrement': True}
+
     @property
     def amount(self):
         return self.quantity * self.unit_price
@@ -189,12 +315,234 @@ class InvoiceItem(db.Model):
 
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, index=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id', ondelete='CASCADE'), nullable=False, index=True)
     amount = db.Column(db.Float, nullable=False)
     payment_date = db.Column(db.Date, default=lambda: date.today(), index=True)
     method = db.Column(db.String(20), default='cash', index=True)  # cash/check/zelle/venmo/card/other
     reference_note = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
 
+    __table_args__ = (
+        # Invoice.payments relationship, ordered by payment_date
+        db.Index('ix_payment_invoice_id_payment_date', 'invoice_id', 'payment_date'),
+        # Revenue sums over a payment_date range, answered from the index alone
+        db.Index('ix_payment_date_amount', 'payment_date', 'amount'),
+        # Never reuse ids on SQLite; archived payments keep theirs
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f'<Payment ${self.amount} on Invoice {self.invoice_id}>'
+
+
+@event.listens_for(InvoiceItem, 'after_insert')
+@event.listens_for(InvoiceItem, 'after_update')
+@event.listens_for(InvoiceItem, 'after_delete')
+@event.listens_for(Payment, 'after_insert')
+@event.listens_for(Payment, 'after_update')
+@event.listens_for(Payment, 'after_delete')
+def _queue_invoice_touch(mapper, connection, target):
+    object_session(target).info.setdefault('touched_invoices', set()).add(target.invoice_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_invoices(session, flush_context):
+    # Item and payment changes alter the invoice's totals; bump updated_at so
+    # incremental API syncs pick the invoice up again
+    invoice_ids = session.info.pop('touched_invoices', None)
+    if invoice_ids:
+        for invoice in session.identity_map.values():
+            if isinstance(invoice, Invoice) and invoice.id in invoice_ids:
+                _forget_totals(invoice)
+        session.execute(update(Invoice).where(Invoice.id.in_(invoice_ids))
+                        .values(updated_at=datetime.now(timezone.utc))
+                        .execution_options(synchronize_session=False))
+
+
+@event.listens_for(Invoice, 'expire')
+@event.listens_for(Invoice.items, 'append')
+@event.listens_for(Invoice.items, 'remove')
+@event.listens_for(Invoice.payments, 'append')
+@event.listens_for(Invoice.payments, 'remove')
+def _forget_totals(target, *args):
+    # Drop the memoised Invoice.totals() once its inputs may have changed;
+    # expire also fires for instances that have already been garbage collected
+    if target is not None:
+        target.__dict__.pop('_totals', None)
+
+
+@event.listens_for(Invoice, 'refresh')
+def _forget_totals_on_refresh(target, context, attrs):
+    # Also fired when a later query only fills in unloaded relationships
+    if attrs is None or 'tax_rate' in attrs:
+        _forget_totals(target)
+
+
+class DailyRevenue(db.Model):
+    """Payments received per day, method and client vehicle make (see app/rollups.py)."""
+    day = db.Column(db.Date, primary_key=True)
+    method = db.Column(db.String(20), primary_key=True)
+    vehicle_make = db.Column(db.String(50), primary_key=True)  # '' when unknown
+    amount = db.Column(db.Float, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_daily_revenue_make_day', 'vehicle_make', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<DailyRevenue {self.day} {self.method} {self.vehicle_make}>'
+
+
+class DailyReceivable(db.Model):
+    """Open balance of sent invoices per due date (see app/rollups.py)."""
+    due_date = db.Column(db.Date, primary_key=True)
+    open_balance = db.Column(db.Float, nullable=False, default=0)
+    open_invoices = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyReceivable {self.due_date}>'
+
+
+class ClientStats(db.Model):
+    """Per-client invoice and payment totals (see app/rollups.py); one row per client."""
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id', ondelete='CASCADE'), primary_key=True)
+    lifetime_paid = db.Column(db.Float, nullable=False, default=0, index=True)
+    open_balance = db.Column(db.Float, nullable=False, default=0, index=True)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    first_invoice_on = db.Column(db.Date)
+    last_invoice_on = db.Column(db.Date, index=True)
+
+    def __repr__(self):
+        return f'<ClientStats {self.client_id}>'
+
+
+class ChangeRecord(db.Model):
+    """One insert, update or delete of a client, invoice, line item or payment (see app/change_feed.py)."""
+    __tablename__ = 'change_feed'
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(6), nullable=False)  # insert/update/delete
+    changes = db.Column(db.JSON)  # {field: [old, new]} for the tracked fields
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
+
+    # Never reuse ids of pruned records; consumer offsets point into this sequence
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    def __repr__(self):
+        return f'<ChangeRecord {self.id} {self.op} {self.entity} {self.entity_id}>'
+
+
+class FeedOffset(db.Model):
+    """How far a change feed consumer has read."""
+    consumer = db.Column(db.String(64), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    gaps = db.Column(db.JSON)  # [[first_id, last_id, skipped_at], ...] skipped ids still re-checked
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<FeedOffset {self.consumer} @ {self.position}>'
+
+
+class ArchivedInvoice(db.Model):
+    """A settled invoice moved out of ``invoice`` by app/archive.py, with its totals frozen."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original invoice id
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id', ondelete='CASCADE'), nullable=False, index=True)
+    invoice_number = db.Column(db.String(20), unique=True, nullable=False)
+    status = db.Column(db.String(20))
+    due_date = db.Column(db.Date)
+    notes = db.Column(db.Text)
+    tax_rate = db.Column(db.Float)
+    total = db.Column(db.Float, nullable=False)
+    paid = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    client = db.relationship('Client')
+    items = db.relationship('ArchivedInvoiceItem', backref='invoice', cascade='all, delete-orphan',
+                            passive_deletes=True, order_by='ArchivedInvoiceItem.id')
+    payments = db.relationship('ArchivedPayment', backref='invoice', cascade='all, delete-orphan',
+                               passive_deletes=True, order_by='ArchivedPayment.payment_date.desc()')
+
+    def __repr__(self):
+        return f'<ArchivedInvoice {self.invoice_number}>'
+
+
+class ArchivedInvoiceItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('archived_invoice.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    description = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Float)
+    unit_price = db.Column(db.Float, nullable=False)
+    taxable = db.Column(db.Boolean)
+
+    @property
+    def amount(self):
+        return self.quantity * self.unit_price
+
+    def __repr__(self):
+        return f'<ArchivedInvoiceItem {self.description}>'
+
+
+class ArchivedPayment(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('archived_invoice.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    amount = db.Column(db.Float, nullable=False)
+    payment_date = db.Column(db.Date, index=True)
+    method = db.Column(db.String(20))
+    reference_note = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<ArchivedPayment ${self.amount} on Invoice {self.invoice_id}>'
+
+
+class InvoiceTemplate(db.Model):
+    """Saved line items for issuing the same invoice to many clients (see app/bulk_invoices.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    tax_rate = db.Column(db.Float, default=0.0825)
+    notes = db.Column(db.Text)
+    items = db.Column(db.JSON, nullable=False)  # [{description, quantity, unit_price, taxable}]
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<InvoiceTemplate {self.name}>'
+
+
+class QueuedEmail(db.Model):
+    """An invoice email waiting for the send-invoice-emails maintenance job (see app/email_queue.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id', ondelete='CASCADE'), nullable=False, index=True)
+    recipients = db.Column(db.String(500), nullable=False)
+    queued_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = db.Column(db.DateTime, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(200))
+
+    def __repr__(self):
+        return f'<QueuedEmail {self.id} for Invoice {self.invoice_id}>'
+
+
+class CatalogItem(db.Model):
+    """A service or part offered on invoices, suggested by the line item typeahead (see app/catalog.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), unique=True, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False, default=0)
+    taxable = db.Column(db.Boolean, nullable=False, default=False)
+    times_used = db.Column(db.Integer, nullable=False, default=0)  # on past invoices; ranks suggestions
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # Case-insensitive duplicate check when seeding: lower(description) = :description
+        db.Index('ix_catalog_item_description_lower', db.func.lower(description)),
+    )
+
+    def __repr__(self):
+        return f'<CatalogItem {self.description}>'
@@ -0,0 +1,116 @@
+"""Read-only rows for list pages, selected column by column.
+
+List views only show a number, a name, a date and an amount, so instead of
+ORM instances (identity map entries, change tracking, deferred columns)
+they render compact named-tuple rows built from a single Core select::
+
+    rows = invoice_rows(limit=5)
+    rows[0].invoice_number, rows[0].client_name, rows[0].total, rows[0].status
+
+Rows are plain values: nothing lazy-loads from them and they are not
+refreshed by later writes. Pages that edit or show one record keep using
+the ORM. ``bench_read_models.py`` compares the two.
+"""
+from collections import namedtuple
+
+from sqlalchemy import func, or_, select
+
+from app import db
+from app.models import Client, ClientStats, Invoice, Payment
+from app.models.models import InvoiceTotals
+from app.totals import item_sums, payment_sums
+
+# `status` is the displayed status (draft, sent, partial, paid or overdue)
+InvoiceRow = namedtuple('InvoiceRow', [
+    'id', 'invoice_number', 'status', 'total', 'balance', 'overdue_days', 'updated_at',
+    'client_id', 'client_name', 'vehicle', 'client_updated_at',
+])
+PaymentRow = namedtuple('PaymentRow', [
+    'id', 'invoice_id', 'amount', 'payment_date', 'method', 'reference_note', 'invoice_number', 'client_name',
+])
+ClientRow = namedtuple('ClientRow', [
+    'id', 'full_name', 'vehicle', 'phone', 'email', 'lifetime_paid', 'open_balance', 'last_invoice_on',
+])
+
+_VEHICLE = (Client.vehicle_year, Client.vehicle_make, Client.vehicle_model, Client.vehicle_trim)
+
+
+def client_search(q):
+    """Filter for the client list search box and the live search."""
+    search = f'%{q}%'
+    return or_(
+        Client.first_name.ilike(search),
+        Client.last_name.ilike(search),
+        Client.email.ilike(search),
+        Client.phone.ilike(search),
+        Client.vehicle_make.ilike(search),
+        Client.vehicle_model.ilike(search),
+    )
+
+
+def invoice_rows(limit=None):
+    """Invoices newest first with their client and money figures; the totals come from one aggregate."""
+    ids = select(Invoice.id)
+    if limit is not None:
+        ids = ids.order_by(Invoice.created_at.desc()).limit(limit)
+    items = item_sums(ids)
+    paid = payment_sums(ids)
+    stmt = (
+        select(Invoice.id, Invoice.invoice_number, Invoice.status, Invoice.due_date, Invoice.tax_rate,
+               Invoice.updated_at, Client.id, Client.first_name, Client.last_name, *_VEHICLE, Client.updated_at,
+               func.coalesce(items.c.subtotal, 0), func.coalesce(items.c.taxable, 0),
+               func.coalesce(paid.c.paid, 0))
+        .join(Client, Client.id == Invoice.client_id)
+        .outerjoin(items, items.c.invoice_id == Invoice.id)
+        .outerjoin(paid, paid.c.invoice_id == Invoice.id)
+        .order_by(Invoice.created_at.desc())
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    rows = []
+    for (inv_id, number, status, due_date, tax_rate, updated_at, client_id, first, last, year, make, model,
+         trim, client_updated_at, subtotal, taxable, paid_total) in db.session.execute(stmt):
+        totals = InvoiceTotals.compute(subtotal, taxable, tax_rate, paid_total)
+        rows.append(InvoiceRow(
+            inv_id, number, Invoice.display_status(status, due_date, totals.total, totals.paid),
+            totals.total, totals.balance, Invoice.overdue_days(due_date), updated_at,
+            client_id, f'{first} {last}', Client.format_vehicle(year, make, model, trim), client_updated_at,
+        ))
+    return rows
+
+
+def payment_rows(method=None, order_by=None, limit=None):
+    """Payments with their invoice number and client name, latest payment date first by default."""
+    stmt = (
+        select(Payment.id, Payment.invoice_id, Payment.amount, Payment.payment_date, Payment.method,
+               Payment.reference_note, Invoice.invoice_number, Client.first_name, Client.last_name)
+        .join(Invoice, Invoice.id == Payment.invoice_id)
+        .join(Client, Client.id == Invoice.client_id)
+        .order_by(*(order_by or [Payment.payment_date.desc()]))
+    )
+    if method is not None:
+        stmt = stmt.where(Payment.method == method)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return [PaymentRow(*row[:7], f'{row.first_name} {row.last_name}') for row in db.session.execute(stmt)]
+
+
+def client_rows(q=None, order_by=None, limit=None):
+    """Clients with their ClientStats figures, by last name unless `order_by` is given.
+
+    Every client has a ClientStats row (app/rollups.py), so this is an inner
+    join and the indexed stats columns can serve the sort.
+    """
+    stmt = (
+        select(Client.id, Client.first_name, Client.last_name, *_VEHICLE, Client.phone, Client.email,
+               ClientStats.lifetime_paid, ClientStats.open_balance, ClientStats.last_invoice_on)
+        .join(ClientStats, ClientStats.client_id == Client.id)
+        .order_by(*(order_by or [Client.last_name.asc()]))
+    )
+    if q:
+        stmt = stmt.where(client_search(q))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return [ClientRow(row.id, f'{row.first_name} {row.last_name}', Client.format_vehicle(*row[3:7]),
+                      row.phone, row.email, row.lifetime_paid, row.open_balance, row.last_invoice_on)
+            for row in db.session.execute(stmt)]
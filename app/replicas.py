@@ -0,0 +1,119 @@
+"""Read-replica routing.
+
+When ``DATABASE_REPLICA_URL`` is configured it is registered as the
+``replica`` bind. Safe (GET/HEAD) requests read from it; anything that
+writes, and every request from the same user for a few seconds after one
+of their writes, stays on the primary. An unhealthy or lagging replica
+falls back to the primary until the next health check passes.
+
+A request counts as having written once it flushes or runs any statement
+through the session that is not a SELECT, including ``text()`` SQL that
+does not start with SELECT. Statements run directly on
+``db.session.connection()`` are not seen; code doing that sets
+``db.session.info['wrote'] = True`` itself (see app/bulk_delete.py).
+"""
+import re
+import threading
+import time
+
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import TextClause, event, text
+
+REPLICA_BIND = 'replica'
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+STICKY_KEY = '_db_primary_until'
+_READ_ONLY_SQL = re.compile(r'\s*select\b', re.IGNORECASE)
+
+_health = {'healthy': True, 'checked_at': 0.0}
+_health_lock = threading.Lock()
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica when the request allows it."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not self.info.get('wrote')
+                and has_app_context() and g.get('use_replica')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+def _is_read(statement):
+    if isinstance(statement, TextClause):
+        return _READ_ONLY_SQL.match(statement.text) is not None
+    return statement.is_select
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_write(orm_execute_state):
+    # Runs before get_bind(), so the statement itself goes to the primary
+    if not _is_read(orm_execute_state.statement):
+        orm_execute_state.session.info['wrote'] = True
+
+
+def _check_replica(engine, max_lag):
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == 'postgresql':
+                lag = conn.execute(text(
+                    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+                )).scalar()
+                return lag is None or lag <= max_lag
+            conn.execute(text('SELECT 1'))
+            return True
+    except Exception:
+        return False
+
+
+def replica_available(app, engine):
+    """Cached replica health; one thread re-checks it every REPLICA_HEALTH_INTERVAL seconds."""
+    if time.monotonic() - _health['checked_at'] < app.config['REPLICA_HEALTH_INTERVAL']:
+        return _health['healthy']
+    if not _health_lock.acquire(blocking=False):
+        return _health['healthy']
+    try:
+        healthy = _check_replica(engine, app.config['REPLICA_MAX_LAG_SECONDS'])
+        if healthy != _health['healthy']:
+            app.logger.warning(f'Read replica is now {"healthy" if healthy else "unavailable"}')
+        _health.update(healthy=healthy, checked_at=time.monotonic())
+        return healthy
+    finally:
+        _health_lock.release()
+
+
+def init_app(app, db):
+    """Route reads to the replica bind, if one is configured."""
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    with app.app_context():
+        replica = db.engines[REPLICA_BIND]
+
+    @event.listens_for(replica, 'handle_error')
+    def on_replica_error(context):
+        if context.is_disconnect:
+            _health.update(healthy=False, checked_at=time.monotonic())
+
+    @app.before_request
+    def choose_bind():
+        g.use_replica = (
+            request.method in SAFE_METHODS
+            and session.get(STICKY_KEY, 0) < time.time()
+            and replica_available(app, replica)
+        )
+
+    @app.after_request
+    def stick_to_primary(response):
+        # Read-your-writes: keep this user on the primary while the replica catches up
+        if db.session.info.get('wrote') and response.status_code < 400:
+            session[STICKY_KEY] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
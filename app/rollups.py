@@ -0,0 +1,447 @@
+"""Rollup tables kept up to date from ORM flushes.
+
+After a flush that touches clients, invoices, line items or payments, the
+affected invoices' figures and payments are read once, and their state
+before the flush is derived from that read by reverting the flush's own
+changes. The stored values of the rows it changed are read, and locked,
+just before it runs. Changes other transactions committed in between are
+then on both sides and cancel out, so the difference added to the daily
+rollup rows is exactly this flush's. Invoices the flush deletes, including
+those removed by ``ON DELETE CASCADE``, are locked and read before it runs.
+The affected clients' ``ClientStats`` rows are recomputed outright,
+counting the frozen totals of archived invoices (app/archive.py). Every
+client has one: it is created in the flush that inserts the client,
+backfilled by migration 0005 and recreated by ``flask reports rebuild``,
+so the client list inner-joins it.
+
+Bulk ``Query.update()`` / ``Query.delete()`` on those tables bypasses
+this, so run ``flask reports rebuild`` after any such script.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from itertools import chain
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import (ArchivedInvoice, ArchivedPayment, Client, ClientStats, DailyReceivable, DailyRevenue,
+                        Invoice, InvoiceItem, Payment)
+from app.replicas import RoutingSession
+from app.totals import item_sums, payment_sums
+
+CHUNK = 500
+
+# The stored columns the rollups depend on, read before a flush changes them
+TRACKED_COLUMNS = {
+    Client: (Client.vehicle_make,),
+    Invoice: (Invoice.client_id, Invoice.status, Invoice.due_date, Invoice.tax_rate, Invoice.created_at),
+    InvoiceItem: (InvoiceItem.invoice_id, InvoiceItem.quantity, InvoiceItem.unit_price, InvoiceItem.taxable),
+    Payment: (Payment.invoice_id, Payment.amount, Payment.payment_date, Payment.method),
+}
+
+
+class InvoiceFacts(namedtuple('InvoiceFacts', ['client_id', 'status', 'due_date', 'created_on', 'tax_rate',
+                                               'subtotal', 'taxable', 'paid'])):
+    __slots__ = ()
+
+    @property
+    def total(self):
+        return self.subtotal + self.taxable * (self.tax_rate or 0)
+
+
+# One payment on an invoice; payment_id is None for archived payments
+PaymentFacts = namedtuple('PaymentFacts', ['payment_id', 'invoice_id', 'client_id', 'day', 'method', 'amount'])
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _line(quantity, unit_price):
+    # NULL * price is NULL in SQL, which the item sums leave out
+    return (quantity or 0) * (unit_price or 0)
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), CHUNK):
+        yield ids[start:start + CHUNK]
+
+
+# ---------- Snapshots ----------
+
+def invoice_facts(conn, invoice_ids):
+    """Money figures for each invoice, computed in SQL."""
+    facts = {}
+    for chunk in _chunks(invoice_ids):
+        items = item_sums(chunk)
+        paid = payment_sums(chunk)
+        rows = conn.execute(
+            select(Invoice.id, Invoice.client_id, Invoice.status, Invoice.due_date, Invoice.created_at,
+                   Invoice.tax_rate, func.coalesce(items.c.subtotal, 0), func.coalesce(items.c.taxable, 0),
+                   func.coalesce(paid.c.paid, 0))
+            .outerjoin(items, items.c.invoice_id == Invoice.id)
+            .outerjoin(paid, paid.c.invoice_id == Invoice.id)
+            .where(Invoice.id.in_(chunk))
+        )
+        for inv_id, client_id, status, due, created, tax_rate, subtotal, taxable, paid_total in rows:
+            facts[inv_id] = InvoiceFacts(client_id, status, due, _day(created), tax_rate, subtotal, taxable,
+                                         paid_total)
+    return facts
+
+
+def payment_facts(conn, invoice_ids):
+    """PaymentFacts for every payment on these invoices, archived or not."""
+    payments = []
+    for chunk in _chunks(invoice_ids):
+        for payment, invoice in ((Payment, Invoice), (ArchivedPayment, ArchivedInvoice)):
+            rows = conn.execute(
+                select(payment.id, payment.invoice_id, invoice.client_id, payment.payment_date, payment.method,
+                       payment.amount)
+                .join(invoice, invoice.id == payment.invoice_id)
+                .where(payment.invoice_id.in_(chunk))
+            )
+            archived = payment is ArchivedPayment
+            payments.extend(PaymentFacts(None if archived else row[0], *row[1:]) for row in rows)
+    return payments
+
+
+def client_makes(conn, client_ids):
+    makes = {}
+    for chunk in _chunks(client_ids):
+        makes.update(conn.execute(select(Client.id, Client.vehicle_make).where(Client.id.in_(chunk))).all())
+    return makes
+
+
+def revenue_cells(conn, invoice_ids):
+    """{(day, method, make): [amount, count]} for the payments on these invoices, archived or not."""
+    cells = defaultdict(lambda: [0.0, 0])
+    for chunk in _chunks(invoice_ids):
+        for payment, invoice in ((Payment, Invoice), (ArchivedPayment, ArchivedInvoice)):
+            rows = conn.execute(
+                select(payment.payment_date, func.coalesce(payment.method, 'other'),
+                       func.coalesce(Client.vehicle_make, ''), func.sum(payment.amount), func.count())
+                .join(invoice, invoice.id == payment.invoice_id)
+                .join(Client, Client.id == invoice.client_id)
+                .where(payment.invoice_id.in_(chunk))
+                .group_by(payment.payment_date, payment.method, Client.vehicle_make)
+            )
+            for day, method, make, amount, count in rows:
+                cell = cells[(day, method, make)]
+                cell[0] += amount
+                cell[1] += count
+    return cells
+
+
+def open_balance(invoice):
+    """Amount still owed on a sent invoice (InvoiceFacts); 0 for drafts and settled invoices."""
+    balance = invoice.total - invoice.paid
+    return balance if invoice.status != 'draft' and balance > 0.005 else 0
+
+
+def payment_cells(payments, make_of):
+    """revenue_cells() computed from PaymentFacts; `make_of(client_id)` gives the client's vehicle make."""
+    cells = defaultdict(lambda: [0.0, 0])
+    for p in payments:
+        cell = cells[(p.day, p.method or 'other', make_of(p.client_id) or '')]
+        cell[0] += p.amount
+        cell[1] += 1
+    return cells
+
+
+def receivable_cells(facts):
+    """{due_date: [open_balance, open_invoices]} for sent invoices with money owing."""
+    cells = defaultdict(lambda: [0.0, 0])
+    for f in facts.values():
+        balance = open_balance(f)
+        if balance:
+            cell = cells[f.due_date or f.created_on]
+            cell[0] += balance
+            cell[1] += 1
+    return cells
+
+
+def snapshot(conn, invoice_ids):
+    facts = invoice_facts(conn, invoice_ids)
+    return {'facts': facts,
+            'revenue': revenue_cells(conn, invoice_ids),
+            'receivables': receivable_cells(facts)}
+
+
+# ---------- Applying deltas ----------
+
+def upsert_add(conn, table, key, values):
+    """Add `values` to the row identified by `key`, inserting it if missing."""
+    dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(conn.dialect.name)
+    if dialect is not None:
+        stmt = dialect.insert(table).values(**key, **values)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={col: table.c[col] + stmt.excluded[col] for col in values},
+        ))
+        return
+    where = [table.c[col] == value for col, value in key.items()]
+    updated = conn.execute(update(table).where(*where).values(
+        {col: table.c[col] + value for col, value in values.items()})).rowcount
+    if not updated:
+        conn.execute(insert(table).values(**key, **values))
+
+
+def _cell_deltas(before, after):
+    for key in set(before) | set(after):
+        old = before.get(key, (0.0, 0))
+        new = after.get(key, (0.0, 0))
+        amount, count = round(new[0] - old[0], 2), new[1] - old[1]
+        if amount or count:
+            yield key, amount, count
+
+
+def apply_deltas(conn, before, after):
+    revenue = DailyRevenue.__table__
+    for (day, method, make), amount, count in _cell_deltas(before['revenue'], after['revenue']):
+        upsert_add(conn, revenue, {'day': day, 'method': method, 'vehicle_make': make},
+                   {'amount': amount, 'payment_count': count})
+        conn.execute(delete(revenue).where(revenue.c.day == day, revenue.c.method == method,
+                                           revenue.c.vehicle_make == make, revenue.c.payment_count <= 0))
+
+    receivable = DailyReceivable.__table__
+    for due, amount, count in _cell_deltas(before['receivables'], after['receivables']):
+        upsert_add(conn, receivable, {'due_date': due}, {'open_balance': amount, 'open_invoices': count})
+        conn.execute(delete(receivable).where(receivable.c.due_date == due, receivable.c.open_invoices <= 0))
+
+
+def _add_invoices(row, paid, balance, count, first, last):
+    row['lifetime_paid'] += paid
+    row['open_balance'] += balance
+    row['invoice_count'] += count
+    row['first_invoice_on'] = min(filter(None, [row['first_invoice_on'], first]), default=None)
+    row['last_invoice_on'] = max(filter(None, [row['last_invoice_on'], last]), default=None)
+
+
+def refresh_client_stats(conn, client_ids):
+    """Recompute the ClientStats rows of these clients; rows of deleted clients are removed."""
+    table = ClientStats.__table__
+    for chunk in _chunks(client_ids):
+        stats = {cid: {'client_id': cid, 'lifetime_paid': 0.0, 'open_balance': 0.0, 'invoice_count': 0,
+                       'first_invoice_on': None, 'last_invoice_on': None}
+                 for cid in conn.execute(select(Client.id).where(Client.id.in_(chunk))).scalars()}
+        invoice_ids = conn.execute(select(Invoice.id).where(Invoice.client_id.in_(chunk))).scalars().all()
+        for f in invoice_facts(conn, invoice_ids).values():
+            _add_invoices(stats[f.client_id], f.paid, open_balance(f), 1, f.created_on, f.created_on)
+        # Archived invoices are settled; their frozen totals still count
+        archived = conn.execute(
+            select(ArchivedInvoice.client_id, func.sum(ArchivedInvoice.paid), func.count(),
+                   func.min(ArchivedInvoice.created_at), func.max(ArchivedInvoice.created_at))
+            .where(ArchivedInvoice.client_id.in_(chunk)).group_by(ArchivedInvoice.client_id)
+        )
+        for client_id, paid, count, first, last in archived:
+            if client_id in stats:
+                _add_invoices(stats[client_id], paid, 0, count, _day(first), _day(last))
+        for row in stats.values():
+            row['lifetime_paid'] = round(row['lifetime_paid'], 2)
+            row['open_balance'] = round(row['open_balance'], 2)
+
+        conn.execute(delete(table).where(table.c.client_id.in_(chunk)))
+        if stats:
+            conn.execute(insert(table), list(stats.values()))
+
+
+def add_new_invoices(conn, invoice_ids):
+    """Fold invoices inserted with Core statements, bypassing the flush hooks, into the rollups."""
+    after = snapshot(conn, invoice_ids)
+    apply_deltas(conn, {'revenue': {}, 'receivables': {}}, after)
+    refresh_client_stats(conn, {f.client_id for f in after['facts'].values()})
+
+
+# ---------- Flush hooks ----------
+
+def invoices_of_clients(conn, client_ids):
+    """Ids of these clients' invoices, archived or not."""
+    ids = set()
+    for chunk in _chunks(client_ids):
+        ids.update(conn.execute(select(Invoice.id).where(Invoice.client_id.in_(chunk))).scalars())
+        ids.update(conn.execute(select(ArchivedInvoice.id).where(ArchivedInvoice.client_id.in_(chunk))).scalars())
+    return ids
+
+
+def lock_invoices(conn, invoice_ids):
+    """Lock these invoices with their line items and payments until commit (PostgreSQL).
+
+    Taken before reading the figures of invoices about to be deleted, so no
+    other transaction can change them in between.
+    """
+    if conn.dialect.name != 'postgresql':
+        return
+    for chunk in _chunks(invoice_ids):
+        conn.execute(select(Invoice.id).where(Invoice.id.in_(chunk)).with_for_update())
+        conn.execute(select(InvoiceItem.id).where(InvoiceItem.invoice_id.in_(chunk)).with_for_update())
+        conn.execute(select(Payment.id).where(Payment.invoice_id.in_(chunk)).with_for_update())
+
+
+def _tracked_ids(objects):
+    ids = defaultdict(set)
+    for obj in objects:
+        if type(obj) in TRACKED_COLUMNS and obj.id is not None:
+            ids[type(obj)].add(obj.id)
+    return ids
+
+
+def tracked_rows(conn, ids, lock=False):
+    """{model: {id: row}} of the tracked columns for these {model: ids}, as stored; deleted rows are absent.
+
+    Read from the database rather than from attribute history, which lacks
+    the old value of an attribute set while it was expired, and knows
+    nothing of orphans deleted during the flush.
+    """
+    rows = {model: {} for model in TRACKED_COLUMNS}
+    for model, model_ids in ids.items():
+        for chunk in _chunks(model_ids):
+            stmt = select(model.id, *TRACKED_COLUMNS[model]).where(model.id.in_(chunk))
+            if lock:
+                stmt = stmt.with_for_update()
+            rows[model].update((row.id, row) for row in conn.execute(stmt))
+    return rows
+
+
+def deleted_invoice_ids(session, conn):
+    """Invoices this flush deletes, directly or by deleting their client."""
+    ids = {obj.id for obj in session.deleted if isinstance(obj, Invoice)}
+    return ids | invoices_of_clients(conn, {obj.id for obj in session.deleted if isinstance(obj, Client)})
+
+
+def affected_invoice_ids(conn, stored, current):
+    ids = set(current[Invoice])
+    for rows in (stored, current):
+        for model in (InvoiceItem, Payment):
+            ids.update(row.invoice_id for row in rows[model].values())
+    moved = [client_id for client_id, row in stored[Client].items()
+             if client_id in current[Client] and current[Client][client_id].vehicle_make != row.vehicle_make]
+    return ids | invoices_of_clients(conn, moved)
+
+
+def facts_before(stored, current, after):
+    """`after` (InvoiceFacts read after the flush) with the flush's own changes reverted.
+
+    `stored` and `current` are the tracked rows the flush changed, read
+    before and after it.
+    """
+    facts = {inv_id: f._asdict() for inv_id, f in after.items() if inv_id in stored[Invoice] or
+             inv_id not in current[Invoice]}
+    for inv_id, row in stored[Invoice].items():
+        if inv_id in facts:
+            facts[inv_id].update(client_id=row.client_id, status=row.status, due_date=row.due_date,
+                                 tax_rate=row.tax_rate, created_on=_day(row.created_at))
+
+    def shift(inv_id, field, amount):
+        if inv_id in facts:
+            facts[inv_id][field] += amount
+
+    for rows, sign in ((current, -1), (stored, 1)):
+        for row in rows[InvoiceItem].values():
+            line = sign * _line(row.quantity, row.unit_price)
+            shift(row.invoice_id, 'subtotal', line)
+            if row.taxable:
+                shift(row.invoice_id, 'taxable', line)
+        for row in rows[Payment].values():
+            shift(row.invoice_id, 'paid', sign * row.amount)
+    return {inv_id: InvoiceFacts(**f) for inv_id, f in facts.items()}
+
+
+def payments_before(stored, current, after, before_facts):
+    """`after` (PaymentFacts read after the flush) with the flush's own changes reverted."""
+    changed = stored[Payment].keys() | current[Payment].keys()
+
+    def client_before(inv_id, default):
+        f = before_facts.get(inv_id)
+        return default if f is None else f.client_id
+
+    payments = [p._replace(client_id=client_before(p.invoice_id, p.client_id)) for p in after
+                if p.payment_id is None or p.payment_id not in changed]
+    for payment_id, row in stored[Payment].items():
+        if row.invoice_id in before_facts:
+            payments.append(PaymentFacts(payment_id, row.invoice_id, before_facts[row.invoice_id].client_id,
+                                         row.payment_date, row.method, row.amount))
+    return payments
+
+
+def affected_client_ids(stored, current, before, after):
+    ids = {f.client_id for f in chain(before.values(), after.values())}
+    # New clients need a stats row, deleted ones lose it
+    ids.update(stored[Client].keys() ^ current[Client].keys())
+    return ids
+
+
+def _touches_rollups(session):
+    return any(isinstance(obj, (Client, Invoice, InvoiceItem, Payment))
+               for obj in chain(session.new, session.dirty, session.deleted))
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _read_before(session, flush_context, instances):
+    session.info.pop('rollup_before', None)
+    if not _touches_rollups(session):
+        return
+    conn = session.connection()
+    # Locked so the rows cannot change again before the flush writes them
+    stored = tracked_rows(conn, _tracked_ids(chain(session.dirty, session.deleted)), lock=True)
+    deleted_ids = deleted_invoice_ids(session, conn)
+    lock_invoices(conn, deleted_ids)
+    session.info['rollup_before'] = (stored, deleted_ids, snapshot(conn, deleted_ids))
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _apply_after(session, flush_context):
+    pending = session.info.pop('rollup_before', None)
+    if pending is None:
+        return
+    stored, deleted_ids, deleted = pending
+    conn = session.connection()
+    current = tracked_rows(conn, _tracked_ids(chain(session.new, session.dirty, session.deleted)))
+    ids = affected_invoice_ids(conn, stored, current) - deleted_ids
+    after_facts = invoice_facts(conn, ids)
+    after_payments = payment_facts(conn, ids)
+    before_facts = facts_before(stored, current, after_facts)
+    before_payments = payments_before(stored, current, after_payments, before_facts)
+
+    makes = client_makes(conn, {p.client_id for p in chain(before_payments, after_payments)})
+    old_makes = {client_id: row.vehicle_make for client_id, row in stored[Client].items()}
+    before_revenue = payment_cells(before_payments, lambda c: old_makes.get(c, makes.get(c)))
+    for key, (amount, count) in deleted['revenue'].items():
+        before_revenue[key][0] += amount
+        before_revenue[key][1] += count
+    before_facts.update(deleted['facts'])
+
+    apply_deltas(conn, {'revenue': before_revenue, 'receivables': receivable_cells(before_facts)},
+                 {'revenue': payment_cells(after_payments, makes.get), 'receivables': receivable_cells(after_facts)})
+    refresh_client_stats(conn, affected_client_ids(stored, current, before_facts, after_facts))
+
+
+# ---------- Rebuild ----------
+
+def rebuild():
+    """Recompute every rollup table from the source tables."""
+    conn = db.session.connection()
+    conn.execute(delete(DailyRevenue.__table__))
+    conn.execute(delete(DailyReceivable.__table__))
+
+    empty = {'revenue': {}, 'receivables': {}}
+    invoice_ids = list(conn.execute(select(Invoice.id)).scalars())
+    invoice_ids += conn.execute(select(ArchivedInvoice.id)).scalars()
+    for chunk in _chunks(invoice_ids):
+        apply_deltas(conn, empty, snapshot(conn, chunk))
+    refresh_client_stats(conn, conn.execute(select(Client.id)).scalars().all())
+    db.session.commit()
+    return len(invoice_ids)
+
+
+reports_cli = AppGroup('reports', help='Reporting rollups.')
+
+
+@reports_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the rollup tables from scratch."""
+    count = rebuild()
+    click.echo(f'Rebuilt rollups from {count} invoices.')
@@ -0,0 +1,205 @@
+"""Read-only JSON API for integrations (bookkeeping, parts supplier).
+
+Every request needs ``Authorization: Bearer <token>`` with one of the
+tokens in ``API_TOKENS``. Each collection takes:
+
+- ``fields=id,email,...``: only these columns (``id`` is always included)
+- ``updated_since=<ISO 8601>``: only rows changed since then
+- ``after=<id>`` and ``limit=<n>``: keyset paging in id order
+- ``format=ndjson`` (or ``Accept: application/x-ndjson``): one object per
+  line, streamed, and a last line ``{"next": url, "sync_timestamp": ts}``;
+  otherwise ``{"data": [...], "next": url, "sync_timestamp": ts}``
+
+``sync_timestamp`` (also the ``X-Sync-Timestamp`` header of JSON pages) is
+the latest change time among the rows served so far, carried from page to
+page through ``next``. Store the one from the last page and pass it as
+``updated_since`` next time; rows changed at exactly that time are sent
+again rather than missed. Deleted rows are not reported.
+"""
+import hmac
+import json
+from collections import namedtuple
+from datetime import date, datetime, timezone
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context, url_for
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Client, Invoice, InvoiceItem, Payment
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+NDJSON = 'application/x-ndjson'
+# Each row's change time, selected alongside the requested fields for the sync watermark
+SYNC_COLUMN = '_sync'
+
+# model, column that updated_since filters on, {field: column expression factory}
+Resource = namedtuple('Resource', ['model', 'updated', 'fields'])
+
+
+def _columns(model, *names):
+    return {name: (lambda name=name: getattr(model, name)) for name in names}
+
+
+def _line_total(taxable_only=False):
+    line = func.coalesce(func.sum(InvoiceItem.quantity * InvoiceItem.unit_price), 0)
+    stmt = select(line).where(InvoiceItem.invoice_id == Invoice.id)
+    if taxable_only:
+        stmt = stmt.where(InvoiceItem.taxable.is_(True))
+    return stmt.scalar_subquery()
+
+
+def _paid():
+    return select(func.coalesce(func.sum(Payment.amount), 0)) \
+        .where(Payment.invoice_id == Invoice.id).scalar_subquery()
+
+
+def _total():
+    return _line_total() + _line_total(taxable_only=True) * func.coalesce(Invoice.tax_rate, 0)
+
+
+RESOURCES = {
+    'clients': Resource(Client, lambda: Client.updated_at, _columns(
+        Client, 'id', 'first_name', 'last_name', 'email', 'phone', 'vehicle_year', 'vehicle_make',
+        'vehicle_model', 'vehicle_trim', 'notes', 'created_at', 'updated_at')),
+    'invoices': Resource(Invoice, lambda: Invoice.updated_at, {
+        **_columns(Invoice, 'id', 'client_id', 'invoice_number', 'status', 'due_date', 'notes',
+                   'tax_rate', 'created_at', 'updated_at'),
+        'subtotal': _line_total,
+        'tax': lambda: _line_total(taxable_only=True) * func.coalesce(Invoice.tax_rate, 0),
+        'total': _total,
+        'paid': _paid,
+        'balance': lambda: _total() - _paid(),
+    }),
+    # Item and payment writes bump their invoice's updated_at (see app/models/models.py)
+    'items': Resource(InvoiceItem, lambda: Invoice.updated_at, _columns(
+        InvoiceItem, 'id', 'invoice_id', 'description', 'quantity', 'unit_price', 'taxable')),
+    'payments': Resource(Payment, lambda: Payment.created_at, _columns(
+        Payment, 'id', 'invoice_id', 'amount', 'payment_date', 'method', 'reference_note', 'created_at')),
+}
+
+
+def _abort(status, message, **headers):
+    response = jsonify(error=message)
+    response.status_code = status
+    response.headers.update(headers)
+    abort(response)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+@api.before_request
+def _authenticate():
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    tokens = current_app.config['API_TOKENS']
+    if not supplied or not any(hmac.compare_digest(supplied.encode(), token.encode()) for token in tokens):
+        _abort(401, 'invalid or missing API token', **{'WWW-Authenticate': 'Bearer'})
+
+
+def _parse_fields(resource):
+    requested = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    if not requested:
+        return list(resource.fields)
+    unknown = sorted(set(requested) - set(resource.fields))
+    if unknown:
+        _abort(400, f'unknown fields: {", ".join(unknown)}')
+    return ['id'] + [f for f in dict.fromkeys(requested) if f != 'id']
+
+
+def _parse_timestamp(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        _abort(400, f'{name} must be an ISO 8601 timestamp')
+    # Timestamps are stored as naive UTC
+    return since.astimezone(timezone.utc).replace(tzinfo=None) if since.tzinfo else since
+
+
+def _format_timestamp(value):
+    return value.replace(tzinfo=timezone.utc).isoformat() if value is not None else None
+
+
+class Page:
+    """Serialises rows and tracks the paging cursor and sync watermark."""
+
+    def __init__(self, resource_name, limit, watermark):
+        self.resource_name = resource_name
+        self.limit = limit
+        self.watermark = watermark
+        self.count = 0
+        self.last_id = None
+
+    def row(self, row):
+        data = row._asdict()
+        updated = data.pop(SYNC_COLUMN)
+        if updated is not None and (self.watermark is None or updated > self.watermark):
+            self.watermark = updated
+        self.count += 1
+        self.last_id = data['id']
+        return data
+
+    @property
+    def sync_timestamp(self):
+        return _format_timestamp(self.watermark)
+
+    @property
+    def next_url(self):
+        if self.count < self.limit:
+            return None
+        args = {**request.args.to_dict(), 'after': self.last_id}
+        if self.watermark is not None:
+            args['watermark'] = self.sync_timestamp
+        return url_for('api.collection', resource_name=self.resource_name, **args)
+
+
+def build_query(resource, fields, updated_since, after, limit):
+    model = resource.model
+    stmt = select(*(resource.fields[name]().label(name) for name in fields), resource.updated().label(SYNC_COLUMN))
+    if model is InvoiceItem:
+        stmt = stmt.join(Invoice, Invoice.id == InvoiceItem.invoice_id)
+    if updated_since is not None:
+        stmt = stmt.where(resource.updated() >= updated_since)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    return stmt.order_by(model.id).limit(limit)
+
+
+@api.route('/<resource_name>')
+def collection(resource_name):
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        _abort(404, f'unknown collection: {resource_name}')
+
+    fields = _parse_fields(resource)
+    updated_since = _parse_timestamp('updated_since')
+    after = request.args.get('after', type=int)
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    stmt = build_query(resource, fields, updated_since, after, limit)
+    # With nothing served, the next sync starts where this one did
+    page = Page(resource_name, limit, _parse_timestamp('watermark') or updated_since)
+
+    wants_ndjson = request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+    if wants_ndjson:
+        def generate():
+            rows = db.session.execute(stmt.execution_options(yield_per=DEFAULT_LIMIT))
+            for row in rows:
+                yield json.dumps(page.row(row), default=_json_default) + '\n'
+            yield json.dumps({'next': page.next_url, 'sync_timestamp': page.sync_timestamp}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+    data = [page.row(row) for row in db.session.execute(stmt)]
+    body = json.dumps({'data': data, 'next': page.next_url, 'sync_timestamp': page.sync_timestamp},
+                      default=_json_default)
+    headers = {'X-Sync-Timestamp': page.sync_timestamp} if page.sync_timestamp else {}
+    return Response(body, mimetype='application/json', headers=headers)
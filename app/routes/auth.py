@@ -1,9 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import os
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, current_user, login_required
 from urllib.parse import urlparse
 from app import db
-from app.models.models import User, PasswordResetToken, InviteCode
+from app.models.models import User, PasswordResetToken, InviteCode, confirm_admin
 from app.email_utils import send_password_reset_email, send_invite_email
+from app.memory_profile import profiler, rss_bytes
+from app.user_cache import user_cache
 
 auth = Blueprint('auth', __name__)
 
@@ -143,7 +146,7 @@ def register_invite(code):
 @auth.route('/admin/users')
 @login_required
 def admin_users():
-    if not current_user.is_admin:
+    if not confirm_admin(current_user):
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
 
@@ -152,10 +155,38 @@ def admin_users():
     return render_template('admin/users.html', users=users, pending_invites=pending_invites)
 
 
+@auth.route('/admin/memory')
+@login_required
+def admin_memory():
+    if not confirm_admin(current_user):
+        flash('Access denied.', 'error')
+        return redirect(url_for('dashboard'))
+
+    endpoints, reports = profiler.snapshot()
+    flagged_only = request.args.get('flagged') == '1'
+    if flagged_only:
+        reports = [r for r in reports if r.flagged]
+    return render_template('admin/memory.html', enabled=current_app.config['MEMORY_PROFILE_ENABLED'],
+                           profiler=profiler, endpoints=endpoints, reports=reports[:50],
+                           flagged_only=flagged_only, rss=rss_bytes(), pid=os.getpid())
+
+
+@auth.route('/admin/memory/reset', methods=['POST'])
+@login_required
+def admin_memory_reset():
+    if not confirm_admin(current_user):
+        flash('Access denied.', 'error')
+        return redirect(url_for('dashboard'))
+
+    profiler.reset()
+    flash('Memory profile cleared for this worker.', 'success')
+    return redirect(url_for('auth.admin_memory'))
+
+
 @auth.route('/admin/invite', methods=['POST'])
 @login_required
 def admin_invite():
-    if not current_user.is_admin:
+    if not confirm_admin(current_user):
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
 
@@ -183,7 +214,7 @@ def admin_invite():
 @auth.route('/admin/users/<int:user_id>/toggle-admin', methods=['POST'])
 @login_required
 def toggle_admin(user_id):
-    if not current_user.is_admin:
+    if not confirm_admin(current_user):
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
 
@@ -205,7 +236,7 @@ def toggle_admin(user_id):
 @auth.route('/admin/users/<int:user_id>/delete', methods=['POST'])
 @login_required
 def delete_user(user_id):
-    if not current_user.is_admin:
+    if not confirm_admin(current_user):
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
 
@@ -227,7 +258,7 @@ def delete_user(user_id):
 @auth.route('/admin/invites/<int:invite_id>/revoke', methods=['POST'])
 @login_required
 def revoke_invite(invite_id):
-    if not current_user.is_admin:
+    if not confirm_admin(current_user):
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
 
@@ -245,6 +276,12 @@ def revoke_invite(invite_id):
 @login_required
 def profile():
     if request.method == 'POST':
+        user = db.session.get(User, current_user.id)
+        if user is None:
+            # Deleted in another worker while its cached principal was still live
+            user_cache.invalidate(current_user.id)
+            logout_user()
+            return redirect(url_for('auth.login'))
         email = request.form.get('email', '').strip().lower()
         username = request.form.get('username', '').strip()
         current_password = request.form.get('current_password', '')
@@ -260,14 +297,14 @@ def profile():
             return redirect(url_for('auth.profile'))
 
         # Check email uniqueness (if changed)
-        if email != current_user.email:
+        if email != user.email:
             existing = User.query.filter_by(email=email).first()
             if existing:
                 flash('That email is already in use.', 'error')
                 return redirect(url_for('auth.profile'))
 
         # Check username uniqueness (if changed)
-        if username != current_user.username:
+        if username != user.username:
             existing = User.query.filter_by(username=username).first()
             if existing:
                 flash('That username is already taken.', 'error')
@@ -275,7 +312,7 @@ def profile():
 
         # Handle password change (optional)
         if new_password:
-            if not current_user.check_password(current_password):
+            if not user.check_password(current_password):
                 flash('Current password is incorrect.', 'error')
                 return redirect(url_for('auth.profile'))
             if len(new_password) < 6:
@@ -284,10 +321,10 @@ def profile():
             if new_password != confirm_password:
                 flash('New passwords do not match.', 'error')
                 return redirect(url_for('auth.profile'))
-            current_user.set_password(new_password)
+            user.set_password(new_password)
 
-        current_user.email = email
-        current_user.username = username
+        user.email = email
+        user.username = username
         db.session.commit()
         flash('Profile updated.', 'success')
         return redirect(url_for('auth.profile'))
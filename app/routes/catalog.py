@@ -0,0 +1,88 @@
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, jsonify
+from flask_login import login_required
+from app import db
+from app.catalog import catalog_index, seed_from_history
+from app.models import CatalogItem
+
+catalog = Blueprint('catalog', __name__, url_prefix='/catalog')
+
+
+@catalog.route('/search')
+@login_required
+def search_api():
+    """JSON API for the line item typeahead; served from the in-memory index."""
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify([])
+    limit = min(max(request.args.get('limit', 10, type=int), 1), current_app.config['CATALOG_MAX_RESULTS'])
+    return jsonify([{
+        'id': s.id,
+        'description': s.description,
+        'unit_price': s.unit_price,
+        'taxable': s.taxable,
+    } for s in catalog_index.search(q, limit=limit)])
+
+
+@catalog.route('/')
+@login_required
+def index():
+    items = CatalogItem.query.order_by(CatalogItem.description).all()
+    return render_template('catalog/index.html', items=items)
+
+
+def _fill(item):
+    item.description = ' '.join(request.form.get('description', '').split())
+    item.unit_price = request.form.get('unit_price', 0, type=float)
+    item.taxable = 'taxable' in request.form
+    if not item.description:
+        flash('Description is required.', 'error')
+        return False
+    with db.session.no_autoflush:
+        duplicate = CatalogItem.query.filter(db.func.lower(CatalogItem.description) == item.description.lower(),
+                                             CatalogItem.id != item.id).first()
+    if duplicate:
+        flash(f'"{duplicate.description}" is already in the catalog.', 'error')
+        return False
+    return True
+
+
+@catalog.route('/create', methods=['POST'])
+@login_required
+def create():
+    item = CatalogItem()
+    if not _fill(item):
+        return redirect(url_for('catalog.index'))
+    db.session.add(item)
+    db.session.commit()
+    flash('Catalog item added.', 'success')
+    return redirect(url_for('catalog.index'))
+
+
+@catalog.route('/<int:id>/edit', methods=['POST'])
+@login_required
+def edit(id):
+    item = db.get_or_404(CatalogItem, id)
+    if not _fill(item):
+        db.session.rollback()
+        return redirect(url_for('catalog.index'))
+    db.session.commit()
+    flash('Catalog item updated.', 'success')
+    return redirect(url_for('catalog.index'))
+
+
+@catalog.route('/<int:id>/delete', methods=['POST'])
+@login_required
+def delete(id):
+    item = db.get_or_404(CatalogItem, id)
+    db.session.delete(item)
+    db.session.commit()
+    flash('Catalog item deleted.', 'success')
+    return redirect(url_for('catalog.index'))
+
+
+@catalog.route('/seed', methods=['POST'])
+@login_required
+def seed():
+    added = seed_from_history()
+    flash(f'Added {added} catalog items from past invoices.', 'success')
+    return redirect(url_for('catalog.index'))
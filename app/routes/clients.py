@@ -1,10 +1,23 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
-from app import db
-from app.models import Client, Invoice
+from sqlalchemy import func, select
+
+from app import bulk_delete, client_lookup, db
+from app.loading import profile
+from app.read_models import client_rows
+from app.totals import load_totals
+from app.models import ArchivedInvoice, Client, ClientStats, Invoice
 
 clients = Blueprint('clients', __name__, url_prefix='/clients')
 
+# Sort options for the client list; the ClientStats columns are indexed
+SORTS = {
+    'name': ('Name', [Client.last_name.asc()]),
+    'spent': ('Lifetime value', [ClientStats.lifetime_paid.desc()]),
+    'balance': ('Balance', [ClientStats.open_balance.desc()]),
+    'recent': ('Last visit', [ClientStats.last_invoice_on.desc().nulls_last()]),
+}
+
 
 @clients.route('/search')
 @login_required
@@ -14,49 +27,34 @@ def search_api():
     if len(q) < 2:
         return jsonify([])
 
-    search = f'%{q}%'
-    results = Client.query.filter(
-        db.or_(
-            Client.first_name.ilike(search),
-            Client.last_name.ilike(search),
-            Client.email.ilike(search),
-            Client.phone.ilike(search),
-            Client.vehicle_make.ilike(search),
-            Client.vehicle_model.ilike(search),
-        )
-    ).order_by(Client.last_name.asc()).limit(20).all()
-
     return jsonify([{
         'id': c.id,
         'full_name': c.full_name,
-        'vehicle': c.vehicle_display,
+        'vehicle': c.vehicle,
         'phone': c.phone or '',
         'email': c.email or '',
         'url': url_for('clients.view', id=c.id),
-    } for c in results])
+    } for c in client_rows(q, limit=20)])
+
+
+@clients.route('/lookup')
+@login_required
+def lookup():
+    """JSON API for the client picker: id, name and vehicle of clients whose name starts with `q`."""
+    q = request.args.get('q', '').strip()
+    return jsonify([choice.as_json() for choice in client_lookup.search(q)])
 
 
 @clients.route('/')
 @login_required
 def index():
     q = request.args.get('q', '').strip()
-    query = Client.query
-
-    if q:
-        search = f'%{q}%'
-        query = query.filter(
-            db.or_(
-                Client.first_name.ilike(search),
-                Client.last_name.ilike(search),
-                Client.email.ilike(search),
-                Client.phone.ilike(search),
-                Client.vehicle_make.ilike(search),
-                Client.vehicle_model.ilike(search),
-            )
-        )
-
-    clients_list = query.order_by(Client.last_name.asc()).all()
-    return render_template('clients/index.html', clients=clients_list, q=q)
+    sort = request.args.get('sort', 'name')
+    if sort not in SORTS:
+        sort = 'name'
+    clients_list = client_rows(q, order_by=SORTS[sort][1])
+    return render_template('clients/index.html', clients=clients_list, q=q,
+                           sort=sort, sorts=SORTS)
 
 
 @clients.route('/create', methods=['GET', 'POST'])
@@ -90,13 +88,14 @@ def create():
 @clients.route('/<int:id>')
 @login_required
 def view(id):
-    client = db.get_or_404(Client, id)
-    # Explicit query with eager-loaded items/payments (via selectin default)
-    invoices = Invoice.query.filter_by(client_id=client.id) \
-        .order_by(Invoice.created_at.desc()).all()
-    total_spent = sum(inv.calculate_paid() for inv in invoices)
-    return render_template('clients/view.html', client=client,
-                           invoices=invoices, total_spent=total_spent)
+    client = db.get_or_404(Client, id, options=profile('client.detail'))
+    invoices = load_totals(Invoice.query.options(*profile('invoice.totals')).filter_by(client_id=client.id)
+                           .order_by(Invoice.created_at.desc()).all())
+    archived_count = db.session.scalar(
+        select(func.count()).select_from(ArchivedInvoice).where(ArchivedInvoice.client_id == client.id))
+    # Totals come from the maintained rollup row (app/rollups.py)
+    return render_template('clients/view.html', client=client, invoices=invoices,
+                           archived_count=archived_count, stats=client.stats)
 
 
 @clients.route('/<int:id>/edit', methods=['GET', 'POST'])
@@ -130,7 +129,21 @@ def edit(id):
 @login_required
 def delete(id):
     client = db.get_or_404(Client, id)
+    # Invoices, payments and archived invoices go with it (ON DELETE CASCADE)
     db.session.delete(client)
     db.session.commit()
     flash('Client deleted.', 'success')
     return redirect(url_for('clients.index'))
+
+
+@clients.route('/bulk-delete', methods=['POST'])
+@login_required
+def delete_selected():
+    client_ids = request.form.getlist('ids', type=int)
+    if not client_ids:
+        flash('Please select at least one client.', 'error')
+        return redirect(url_for('clients.index'))
+    deleted = bulk_delete.delete_clients(client_ids)
+    db.session.commit()
+    flash(f'{deleted} client(s) deleted.', 'success')
+    return redirect(url_for('clients.index'))
@@ -1,9 +1,13 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
 from datetime import date, datetime, timezone
-from app import db
-from app.models import Client, Invoice, InvoiceItem, Payment
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+from app import archive, bulk_delete, bulk_invoices, client_lookup, db
+from app.models import ArchivedInvoice, Client, Invoice, InvoiceItem, InvoiceTemplate, Payment
 from app.email_utils import send_invoice_email
+from app.loading import profile
+from app.read_models import invoice_rows
 
 invoices = Blueprint('invoices', __name__, url_prefix='/invoices')
 
@@ -13,20 +17,15 @@ invoices = Blueprint('invoices', __name__, url_prefix='/invoices')
 def index():
     status_filter = request.args.get('status', 'all')
 
-    # Single query — items & payments already eager-loaded via selectin
-    all_invoices = Invoice.query.options(
-        db.joinedload(Invoice.client)
-    ).order_by(Invoice.created_at.desc()).all()
-
-    # Compute each invoice's status once
-    invoice_with_status = [(inv, inv.get_status()) for inv in all_invoices]
+    # Column-only rows with each invoice's totals and status (app/read_models.py)
+    all_invoices = invoice_rows()
 
     counts = {'all': len(all_invoices)}
     for s in ['draft', 'sent', 'partial', 'paid', 'overdue']:
-        counts[s] = sum(1 for _, st in invoice_with_status if st == s)
+        counts[s] = sum(1 for inv in all_invoices if inv.status == s)
 
     if status_filter != 'all':
-        filtered = [inv for inv, st in invoice_with_status if st == status_filter]
+        filtered = [inv for inv in all_invoices if inv.status == status_filter]
     else:
         filtered = all_invoices
 
@@ -34,12 +33,31 @@ def index():
                            status_filter=status_filter, counts=counts)
 
 
+@invoices.route('/archive')
+@login_required
+def archived():
+    q = request.args.get('q', '').strip()
+    client_id = request.args.get('client_id', type=int)
+    page = archive.search(q, client_id).options(contains_eager(ArchivedInvoice.client),
+                                                *profile('archive.list')) \
+        .paginate(page=request.args.get('page', 1, type=int), per_page=50, error_out=False)
+    client = db.session.get(Client, client_id) if client_id else None
+    return render_template('invoices/archive.html', page=page, q=q, client=client)
+
+
+@invoices.route('/archive/<int:id>')
+@login_required
+def view_archived(id):
+    invoice = db.get_or_404(ArchivedInvoice, id, options=profile('archive.detail'))
+    return render_template('invoices/archived_view.html', invoice=invoice)
+
+
 @invoices.route('/create', methods=['GET', 'POST'])
 @login_required
 def create():
     if request.method == 'POST':
         client_id = request.form.get('client_id', type=int)
-        if not client_id:
+        if client_lookup.get(client_id) is None:
             flash('Please select a client.', 'error')
             return redirect(url_for('invoices.create'))
 
@@ -95,28 +113,101 @@ def create():
         flash('Invoice created.', 'success')
         return redirect(url_for('invoices.view', id=invoice.id))
 
-    clients = Client.query.order_by(Client.last_name).all()
     next_number = Invoice.generate_number()
-    return render_template('invoices/form.html', invoice=None, clients=clients,
+    return render_template('invoices/form.html', invoice=None,
+                           selected_client=client_lookup.get(request.args.get('client_id', type=int)),
                            next_number=next_number, editing=False)
 
 
+@invoices.route('/bulk', methods=['GET', 'POST'])
+@login_required
+def bulk():
+    source_invoice_id = request.values.get('from_invoice', type=int)
+    source_invoice = db.get_or_404(Invoice, source_invoice_id, options=profile('invoice.edit')) \
+        if source_invoice_id else None
+    templates = InvoiceTemplate.query.order_by(InvoiceTemplate.name).all()
+
+    if request.method == 'POST':
+        template_id = request.form.get('template_id', type=int)
+        if source_invoice is not None and not template_id:
+            source = bulk_invoices.from_invoice(source_invoice)
+        elif template_id:
+            source = bulk_invoices.from_template(db.get_or_404(InvoiceTemplate, template_id))
+        else:
+            flash('Please choose a template.', 'error')
+            return redirect(url_for('invoices.bulk'))
+
+        client_ids = request.form.getlist('client_ids[]', type=int)
+        if not client_ids:
+            flash('Please select at least one client.', 'error')
+            return redirect(request.full_path)
+
+        due_date_str = request.form.get('due_date', '')
+        try:
+            due_date = date.fromisoformat(due_date_str) if due_date_str else None
+        except ValueError:
+            due_date = None
+
+        template_name = request.form.get('template_name', '').strip()
+        if template_name:
+            if InvoiceTemplate.query.filter_by(name=template_name).first():
+                flash(f'A template named "{template_name}" already exists.', 'error')
+                return redirect(request.full_path)
+            bulk_invoices.save_template(template_name, source)
+
+        status = request.form.get('status', 'draft')
+        try:
+            issued = bulk_invoices.issue(source, client_ids, status=status if status in ('draft', 'sent') else 'draft',
+                                         due_date=due_date, email='send_email' in request.form)
+            db.session.commit()
+        except IntegrityError:
+            # Another invoice took one of the reserved numbers first
+            db.session.rollback()
+            flash('Invoice numbers changed while issuing. Please try again.', 'error')
+            return redirect(request.full_path)
+
+        if not issued.numbers:
+            flash('None of the selected clients exist any more.', 'error')
+            return redirect(request.full_path)
+        message = f'Issued {len(issued.numbers)} invoice(s), {issued.numbers[0]} to {issued.numbers[-1]}'
+        if 'send_email' in request.form:
+            message += f'; {len(issued.numbers) - issued.unemailed} email(s) queued'
+            if issued.unemailed:
+                message += f', {issued.unemailed} client(s) without an email address skipped'
+        flash(message + '.', 'success')
+        return redirect(url_for('invoices.index'))
+
+    return render_template('invoices/bulk.html', templates=templates, source_invoice=source_invoice)
+
+
+@invoices.route('/templates/<int:id>/delete', methods=['POST'])
+@login_required
+def delete_template(id):
+    template = db.get_or_404(InvoiceTemplate, id)
+    db.session.delete(template)
+    db.session.commit()
+    flash(f'Template "{template.name}" deleted.', 'success')
+    return redirect(url_for('invoices.bulk'))
+
+
 @invoices.route('/<int:id>')
 @login_required
 def view(id):
-    invoice = Invoice.query.options(
-        db.joinedload(Invoice.client)
-    ).get_or_404(id)
+    invoice = db.get_or_404(Invoice, id, options=profile('invoice.detail'))
     return render_template('invoices/view.html', invoice=invoice, today=date.today().isoformat())
 
 
 @invoices.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit(id):
-    invoice = db.get_or_404(Invoice, id)
+    invoice = db.get_or_404(Invoice, id, options=profile('invoice.edit'))
 
     if request.method == 'POST':
-        invoice.client_id = request.form.get('client_id', type=int)
+        client_id = request.form.get('client_id', type=int)
+        if client_lookup.get(client_id) is None:
+            flash('Please select a client.', 'error')
+            return redirect(url_for('invoices.edit', id=invoice.id))
+        invoice.client_id = client_id
         invoice.status = request.form.get('status', 'draft')
         invoice.tax_rate = request.form.get('tax_rate', 0.0825, type=float)
         invoice.notes = request.form.get('notes', '').strip()
@@ -124,8 +215,9 @@ def edit(id):
         due_date_str = request.form.get('due_date', '')
         invoice.due_date = date.fromisoformat(due_date_str) if due_date_str else None
 
-        # Clear existing items and rebuild
-        InvoiceItem.query.filter_by(invoice_id=invoice.id).delete()
+        # Clear existing items and rebuild; deleted as orphans on flush so the
+        # revenue rollups see them
+        invoice.items.clear()
 
         descriptions = request.form.getlist('item_description[]')
         quantities = request.form.getlist('item_quantity[]')
@@ -156,22 +248,22 @@ def edit(id):
         flash('Invoice updated.', 'success')
         return redirect(url_for('invoices.view', id=invoice.id))
 
-    clients = Client.query.order_by(Client.last_name).all()
-    return render_template('invoices/form.html', invoice=invoice, clients=clients,
+    return render_template('invoices/form.html', invoice=invoice,
+                           selected_client=client_lookup.get(invoice.client_id),
                            next_number=invoice.invoice_number, editing=True)
 
 
 @invoices.route('/<int:id>/print')
 @login_required
 def print_view(id):
-    invoice = db.get_or_404(Invoice, id)
+    invoice = db.get_or_404(Invoice, id, options=profile('invoice.pdf'))
     return render_template('invoices/print.html', invoice=invoice)
 
 
 @invoices.route('/<int:id>/duplicate', methods=['POST'])
 @login_required
 def duplicate(id):
-    original = db.get_or_404(Invoice, id)
+    original = db.get_or_404(Invoice, id, options=profile('invoice.edit'))
 
     new_invoice = Invoice(
         client_id=original.client_id,
@@ -203,12 +295,26 @@ def duplicate(id):
 @login_required
 def delete(id):
     invoice = db.get_or_404(Invoice, id)
+    # Line items and payments go with it (ON DELETE CASCADE)
     db.session.delete(invoice)
     db.session.commit()
     flash('Invoice deleted.', 'success')
     return redirect(url_for('invoices.index'))
 
 
+@invoices.route('/bulk-delete', methods=['POST'])
+@login_required
+def delete_selected():
+    invoice_ids = request.form.getlist('ids', type=int)
+    if not invoice_ids:
+        flash('Please select at least one invoice.', 'error')
+        return redirect(url_for('invoices.index'))
+    deleted = bulk_delete.delete_invoices(invoice_ids)
+    db.session.commit()
+    flash(f'{deleted} invoice(s) deleted.', 'success')
+    return redirect(url_for('invoices.index'))
+
+
 @invoices.route('/<int:id>/payments', methods=['POST'])
 @login_required
 def record_payment(id):
@@ -251,7 +357,7 @@ def record_payment(id):
 @invoices.route('/<int:id>/email', methods=['POST'])
 @login_required
 def email_invoice(id):
-    invoice = db.get_or_404(Invoice, id)
+    invoice = db.get_or_404(Invoice, id, options=profile('invoice.pdf'))
 
     recipients = request.form.get('recipients', '').strip()
     if not recipients:
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required
 from app import db
+from app.read_models import payment_rows
 from app.models import Payment
 
 payments = Blueprint('payments', __name__, url_prefix='/payments')
@@ -10,12 +11,7 @@ payments = Blueprint('payments', __name__, url_prefix='/payments')
 @login_required
 def index():
     method_filter = request.args.get('method', 'all')
-    query = Payment.query.order_by(Payment.payment_date.desc())
-
-    if method_filter != 'all':
-        query = query.filter_by(method=method_filter)
-
-    payments_list = query.all()
+    payments_list = payment_rows(method=None if method_filter == 'all' else method_filter)
     return render_template('payments/index.html', payments=payments_list,
                            method_filter=method_filter)
 
@@ -0,0 +1,73 @@
+from collections import OrderedDict, defaultdict
+from datetime import date, timedelta
+
+from flask import Blueprint, render_template, request
+from flask_login import login_required
+from sqlalchemy import func
+
+from app import db
+from app.models import DailyReceivable, DailyRevenue
+
+reports = Blueprint('reports', __name__, url_prefix='/reports')
+
+METHODS = ['cash', 'check', 'zelle', 'venmo', 'card', 'other']
+AGING_BUCKETS = [('Current', None, 0), ('1–30 days', 1, 30), ('31–60 days', 31, 60),
+                 ('61–90 days', 61, 90), ('90+ days', 91, None)]
+
+
+def _date_arg(name, default):
+    value = request.args.get(name, '')
+    try:
+        return date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
+
+
+def revenue_by_month(start, end):
+    """{'YYYY-MM': {method: amount}} folded from the daily rollup."""
+    rows = db.session.query(DailyRevenue.day, DailyRevenue.method, func.sum(DailyRevenue.amount)) \
+        .filter(DailyRevenue.day.between(start, end)) \
+        .group_by(DailyRevenue.day, DailyRevenue.method).all()
+    months = defaultdict(lambda: defaultdict(float))
+    for day, method, amount in rows:
+        months[day.strftime('%Y-%m')][method] += amount
+    return OrderedDict(sorted(months.items()))
+
+
+def top_makes(start, end, limit=10):
+    total = func.sum(DailyRevenue.amount)
+    return db.session.query(DailyRevenue.vehicle_make, total, func.sum(DailyRevenue.payment_count)) \
+        .filter(DailyRevenue.day.between(start, end)) \
+        .group_by(DailyRevenue.vehicle_make).order_by(total.desc()).limit(limit).all()
+
+
+def receivables_aging(as_of):
+    """[(label, balance, invoices)] for open balances by days past due."""
+    buckets = OrderedDict((label, [0.0, 0]) for label, _, _ in AGING_BUCKETS)
+    for due_date, balance, count in db.session.query(
+            DailyReceivable.due_date, DailyReceivable.open_balance, DailyReceivable.open_invoices):
+        days = (as_of - due_date).days
+        for label, low, high in AGING_BUCKETS:
+            if (low is None or days >= low) and (high is None or days <= high):
+                buckets[label][0] += balance
+                buckets[label][1] += count
+                break
+    return [(label, balance, count) for label, (balance, count) in buckets.items()]
+
+
+@reports.route('/')
+@login_required
+def index():
+    today = date.today()
+    end = _date_arg('end', today)
+    start = _date_arg('start', (end.replace(day=1) - timedelta(days=335)).replace(day=1))
+
+    months = revenue_by_month(start, end)
+    methods = [m for m in METHODS if any(m in row for row in months.values())]
+    methods += sorted({m for row in months.values() for m in row} - set(methods))
+    method_totals = {m: sum(row.get(m, 0) for row in months.values()) for m in methods}
+
+    return render_template('reports/index.html', start=start, end=end, months=months,
+                           methods=methods, method_totals=method_totals,
+                           revenue_total=sum(method_totals.values()),
+                           makes=top_makes(start, end), aging=receivables_aging(today))
@@ -0,0 +1,75 @@
+"""Embedded SQLite profile for single-box deployments without DATABASE_URL.
+
+With ``SQLITE_PROFILE=production`` (the default) every new SQLite
+connection is set up for a threaded gunicorn worker:
+
+- ``journal_mode=WAL``: readers no longer block on a writer, and a
+  writer no longer waits for readers to finish
+- ``synchronous=NORMAL``: fsync at checkpoints rather than every commit;
+  durable across application crashes, may lose the last commits on power
+  loss
+- ``busy_timeout``: wait for the write lock instead of failing at once
+- ``cache_size``, ``mmap_size`` and ``temp_store=MEMORY`` for fewer reads
+  through the file system
+- ``journal_size_limit``: truncate the WAL file after checkpoints
+
+The ``sqlite-checkpoint`` maintenance job checkpoints the WAL and runs
+``PRAGMA optimize``. ``SQLITE_PROFILE=default`` leaves SQLite's own
+settings alone; ``python bench_sqlite.py`` compares the two.
+
+Whatever the profile, ``foreign_keys=ON`` is set on every SQLite
+connection: deleting a client or invoice relies on ``ON DELETE CASCADE``
+to remove its invoices, line items and payments.
+"""
+from sqlalchemy import event, text
+
+
+def pragmas(config):
+    """PRAGMA statements for the configured profile, in the order they are run."""
+    if config['SQLITE_PROFILE'] != 'production':
+        return []
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA busy_timeout={config['SQLITE_BUSY_TIMEOUT_MS']}",
+        # Negative cache_size is in KiB, per connection
+        f"PRAGMA cache_size=-{config['SQLITE_CACHE_SIZE_KB']}",
+        f"PRAGMA mmap_size={config['SQLITE_MMAP_SIZE']}",
+        'PRAGMA temp_store=MEMORY',
+        f"PRAGMA journal_size_limit={config['SQLITE_JOURNAL_SIZE_LIMIT']}",
+    ]
+
+
+def _is_file_database(engine):
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+
+def _runner(statements):
+    def _apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+    return _apply
+
+
+def init_app(app, db):
+    """Enforce foreign keys on every SQLite connection, and run the profile's pragmas on file databases."""
+    statements = pragmas(app.config)
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+
+    for engine in engines:
+        extra = statements if _is_file_database(engine) else []
+        event.listen(engine, 'connect', _runner(['PRAGMA foreign_keys=ON'] + extra))
+
+
+def checkpoint(conn):
+    """Checkpoint the WAL (truncating it) and let SQLite refresh statistics it finds stale."""
+    busy, wal_pages, checkpointed = conn.execute(text('PRAGMA wal_checkpoint(TRUNCATE)')).one()
+    conn.execute(text('PRAGMA optimize'))
+    if busy:
+        return f'checkpoint incomplete ({checkpointed}/{wal_pages} pages), readers still active'
+    return f'checkpointed {checkpointed} pages'
@@ -0,0 +1,69 @@
+"""Money figures for many invoices from one aggregate query.
+
+List pages call ``load_totals(invoices)`` instead of loading every line
+item and payment just to sum them::
+
+    invoices = Invoice.query.options(*profile('invoice.list')).all()
+    load_totals(invoices)
+
+Subtotal, taxable subtotal and paid are summed in SQL, grouped by
+``invoice_id``, and attached to each instance, so ``calculate_*()`` and
+``get_status()`` answer without touching ``items`` or ``payments``. An
+invoice that was not batch-loaded computes its figures from its children
+on the first call and keeps them until it is expired (on commit, say).
+"""
+from sqlalchemy import case, func, select
+
+from app import db
+from app.models import Invoice, InvoiceItem, Payment
+from app.models.models import InvoiceTotals
+
+CHUNK = 500
+
+
+def item_sums(invoice_ids):
+    """Subquery of (invoice_id, subtotal, taxable) for these invoices' line items."""
+    line = InvoiceItem.quantity * InvoiceItem.unit_price
+    return (select(InvoiceItem.invoice_id,
+                   func.sum(line).label('subtotal'),
+                   func.sum(case((InvoiceItem.taxable.is_(True), line), else_=0)).label('taxable'))
+            .where(InvoiceItem.invoice_id.in_(invoice_ids))
+            .group_by(InvoiceItem.invoice_id).subquery())
+
+
+def payment_sums(invoice_ids):
+    """Subquery of (invoice_id, paid) for these invoices' payments."""
+    return (select(Payment.invoice_id, func.sum(Payment.amount).label('paid'))
+            .where(Payment.invoice_id.in_(invoice_ids))
+            .group_by(Payment.invoice_id).subquery())
+
+
+def fetch_sums(conn, invoice_ids):
+    """{invoice_id: (subtotal, taxable, paid)}; invoices without children get zeros."""
+    sums = {}
+    invoice_ids = sorted(invoice_ids)
+    for start in range(0, len(invoice_ids), CHUNK):
+        chunk = invoice_ids[start:start + CHUNK]
+        items = item_sums(chunk)
+        paid = payment_sums(chunk)
+        rows = conn.execute(
+            select(Invoice.id, func.coalesce(items.c.subtotal, 0), func.coalesce(items.c.taxable, 0),
+                   func.coalesce(paid.c.paid, 0))
+            .outerjoin(items, items.c.invoice_id == Invoice.id)
+            .outerjoin(paid, paid.c.invoice_id == Invoice.id)
+            .where(Invoice.id.in_(chunk))
+        )
+        for inv_id, subtotal, taxable, paid_total in rows:
+            sums[inv_id] = (subtotal, taxable, paid_total)
+    return sums
+
+
+def load_totals(invoices):
+    """Attach InvoiceTotals to each persistent invoice; returns the invoices."""
+    invoices = list(invoices)
+    persistent = [inv for inv in invoices if inv.id is not None]
+    sums = fetch_sums(db.session.connection(), {inv.id for inv in persistent})
+    for inv in persistent:
+        subtotal, taxable, paid = sums.get(inv.id, (0, 0, 0))
+        inv._totals = InvoiceTotals.compute(subtotal, taxable, inv.tax_rate, paid)
+    return invoices
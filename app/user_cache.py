@@ -0,0 +1,74 @@
+"""Process-wide cache of logged-in users for ``login_manager.user_loader``.
+
+Only a small read-only ``Principal`` is cached (no password hash, no ORM
+state), so authenticated requests that never touch user data run without
+a user query. Entries expire after ``USER_CACHE_TTL`` seconds and are
+dropped as soon as a change to the user is committed in this process.
+Other workers pick the change up when their entry expires, so for up to
+that many seconds a deleted user stays logged in there. Admin routes do
+not rely on the cache: they re-check ``is_admin`` with
+``app.models.models.confirm_admin``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from flask_login import UserMixin
+
+
+@dataclass(frozen=True, eq=False)
+class Principal(UserMixin):
+    id: int
+    username: str
+    email: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, username=user.username, email=user.email, is_admin=bool(user.is_admin))
+
+
+class UserCache:
+    """Thread-safe LRU of principals with a per-entry TTL."""
+
+    def __init__(self, ttl=5, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def put(self, principal):
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def init_app(app):
+    user_cache.ttl = app.config['USER_CACHE_TTL']
+    user_cache.maxsize = app.config['USER_CACHE_SIZE']
@@ -0,0 +1,113 @@
+"""Start-up warm-up so a fresh replica serves its first requests at full speed.
+
+Before a server process serves, every template is compiled (backed by an
+on-disk bytecode cache), the ORM mappers are configured, the PDF/image
+libraries are imported and a few pooled connections are opened.
+``/readyz`` answers 503 until that has finished in this process, so the
+platform only routes traffic to warmed instances.
+"""
+import importlib
+import os
+import tempfile
+import threading
+import time
+
+from flask import jsonify, request
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.orm import configure_mappers
+
+HEAVY_MODULES = ('fpdf', 'PIL.Image', 'PIL.ImageDraw')
+
+# Per process: a forked worker inherits the preloading master's state, which is never ready
+_state = {'ready': False, 'timings': {}}
+_lock = threading.Lock()
+
+
+def init_template_cache(app):
+    """Give Jinja a bytecode cache; must run before ``app.jinja_env`` is first used."""
+    cache_dir = app.config['TEMPLATE_CACHE_DIR'] or os.path.join(tempfile.gettempdir(), 'rickifast-jinja')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(cache_dir)}
+
+
+def _timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    _state['timings'][name] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def _compile_templates(app):
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+def _import_heavy_modules(app):
+    for module in HEAVY_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            app.logger.warning(f'Warm-up could not import {module}: {e}')
+
+
+def prime_pool(app, db):
+    """Open up to WARMUP_POOL_CONNECTIONS connections per engine and return them to the pool."""
+    with app.app_context():
+        for engine in db.engines.values():
+            size = engine.pool.size() if hasattr(engine.pool, 'size') else 1
+            connections = []
+            try:
+                for _ in range(min(app.config['WARMUP_POOL_CONNECTIONS'], size)):
+                    connections.append(engine.connect())
+            except Exception as e:
+                app.logger.warning(f'Warm-up could not prime the connection pool: {e}')
+            finally:
+                for conn in connections:
+                    conn.close()
+
+
+def prepare(app):
+    """The process-wide part of warm-up, shared with forked workers when gunicorn preloads the app."""
+    _timed('templates', lambda: _compile_templates(app))
+    _timed('mappers', configure_mappers)
+    _timed('imports', lambda: _import_heavy_modules(app))
+
+
+def warm_up(app, db):
+    """Warm this process up and mark it ready; call it in each server process before it serves."""
+    with _lock:
+        if _state['ready']:
+            return
+        started = time.perf_counter()
+        prepare(app)
+        _timed('pool', lambda: prime_pool(app, db))
+
+        startup = time.perf_counter() - started
+        _state['timings']['startup'] = round(startup, 4)
+        _state['ready'] = True
+    if startup > app.config['STARTUP_TIME_BUDGET']:
+        app.logger.warning(f'Warm-up took {startup:.2f}s, over the {app.config["STARTUP_TIME_BUDGET"]}s budget: '
+                           f'{_state["timings"]}')
+
+
+def init_app(app, db):
+    """Register /readyz and warm up before the first request unless WARMUP_ENABLED is off.
+
+    Nothing is warmed here, so CLI commands (``flask db upgrade``, the
+    maintenance jobs) and scripts never pay for it. gunicorn warms each
+    worker in ``post_worker_init`` before it accepts connections (see
+    gunicorn.conf.py); other servers warm up on their first request.
+    """
+
+    @app.route('/readyz')
+    def readyz():
+        return jsonify(ready=_state['ready'], timings=_state['timings']), 200 if _state['ready'] else 503
+
+    if not app.config['WARMUP_ENABLED'] or app.testing:
+        _state['ready'] = True
+        return
+
+    @app.before_request
+    def _warm_up_before_serving():
+        if not _state['ready'] and request.endpoint != 'readyz':
+            warm_up(app, db)
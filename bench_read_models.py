@@ -0,0 +1,98 @@
+"""Compare the list pages' ORM queries with the read-model rows that replaced them.
+
+    python bench_read_models.py [--clients 500] [--repeat 20]
+
+Seeds a fresh SQLite database (see bench_sqlite.seed), then for the invoice,
+payment and client lists loads every row both ways: the ORM query the page
+used to run, and the app.read_models function it runs now. For each it
+prints the median time per row and the peak traced memory per row while
+the result was built and held, which is what a request pays for its list.
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_sqlite import seed  # noqa: E402
+
+
+def _measure(load, repeat):
+    """(rows, median seconds, peak traced bytes) for `load()`; each run starts from an empty session."""
+    from app import db
+
+    timings = []
+    for _ in range(repeat):
+        db.session.remove()
+        gc.collect()
+        start = time.perf_counter()
+        rows = load()
+        timings.append(time.perf_counter() - start)
+        del rows
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    rows = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(rows), statistics.median(timings), peak
+
+
+def cases():
+    from sqlalchemy.orm import contains_eager, joinedload
+
+    from app import read_models
+    from app.models import Client, Invoice, Payment
+    from app.totals import load_totals
+
+    return [
+        ('invoices',
+         lambda: load_totals(Invoice.query.options(joinedload(Invoice.client))
+                             .order_by(Invoice.created_at.desc()).all()),
+         read_models.invoice_rows),
+        ('payments',
+         lambda: Payment.query.options(joinedload(Payment.invoice).joinedload(Invoice.client))
+         .order_by(Payment.payment_date.desc()).all(),
+         read_models.payment_rows),
+        ('clients',
+         lambda: Client.query.join(Client.stats).options(contains_eager(Client.stats))
+         .order_by(Client.last_name.asc()).all(),
+         read_models.client_rows),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                           'WARMUP_ENABLED': 'false', 'MEMORY_PROFILE_ENABLED': 'false'})
+        os.environ.pop('DATABASE_REPLICA_URL', None)
+
+        from app import create_app, db
+
+        app = create_app()
+        with app.app_context():
+            seed(db, clients=args.clients)
+            db.session.remove()
+
+            print(f"{'list':10} {'rows':>6} {'orm us/row':>11} {'rows us/row':>12} "
+                  f"{'orm B/row':>10} {'rows B/row':>11} {'saved':>7}")
+            for name, orm, rows in cases():
+                count, orm_time, orm_peak = _measure(orm, args.repeat)
+                _, row_time, row_peak = _measure(rows, args.repeat)
+                count = max(count, 1)
+                print(f'{name:10} {count:>6} {orm_time / count * 1e6:>11.1f} {row_time / count * 1e6:>12.1f} '
+                      f'{orm_peak // count:>10} {row_peak // count:>11} {1 - row_peak / orm_peak:>7.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Compare SQLite throughput with the production profile and with SQLite's defaults.
+
+    python bench_sqlite.py [--threads 8] [--seconds 10] [--write-ratio 0.2]
+
+Each profile runs in its own process against a fresh database file seeded
+with the same data. Worker threads mix reads (the invoice list with batch
+totals) and writes (recording a payment, which also maintains the rollups
+and change feed) for a fixed time, and the script prints operations per
+second, read latency and how many operations failed with "database is
+locked".
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = ('default', 'production')
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seed(db, clients=200, invoices_per_client=5):
+    from app.models import Client, Invoice, InvoiceItem, Payment
+
+    db.create_all()
+    rng = random.Random(42)
+    number = 0
+    for c in range(clients):
+        client = Client(first_name=f'First{c}', last_name=f'Last{c}', email=f'client{c}@example.com',
+                        vehicle_make=rng.choice(['Honda', 'Subaru', 'Ford', 'BMW']))
+        db.session.add(client)
+        db.session.flush()
+        for _ in range(invoices_per_client):
+            number += 1
+            invoice = Invoice(client_id=client.id, invoice_number=f'INV-{number:05d}', status='sent',
+                              due_date=date.today() - timedelta(days=rng.randint(-30, 90)))
+            invoice.items = [InvoiceItem(description='Tune', quantity=1, unit_price=rng.randint(100, 900),
+                                         taxable=True),
+                             InvoiceItem(description='Dyno', quantity=2, unit_price=150)]
+            db.session.add(invoice)
+            db.session.flush()
+            if rng.random() < 0.5:
+                db.session.add(Payment(invoice_id=invoice.id, amount=rng.randint(50, 500)))
+        db.session.commit()
+    return number
+
+
+def run(profile, threads, seconds, write_ratio):
+    """Run the workload in this process; the profile is picked up from the environment."""
+    from sqlalchemy.exc import OperationalError
+
+    from app import create_app, db
+    from app.loading import profile as loading_profile
+    from app.models import Invoice, Payment
+    from app.totals import load_totals
+
+    app = create_app()
+    with app.app_context():
+        invoice_count = seed(db)
+        journal = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        db.session.remove()
+
+    stop = time.perf_counter() + seconds
+    lock = threading.Lock()
+    results = {'reads': 0, 'writes': 0, 'locked': 0, 'read_latency': []}
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        reads = writes = locked = 0
+        latency = []
+        with app.app_context():
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                try:
+                    if rng.random() < write_ratio:
+                        db.session.add(Payment(invoice_id=rng.randint(1, invoice_count), amount=25))
+                        db.session.commit()
+                        writes += 1
+                    else:
+                        offset = rng.randint(0, max(0, invoice_count - 50))
+                        load_totals(Invoice.query.options(*loading_profile('invoice.list'))
+                                    .order_by(Invoice.created_at.desc()).offset(offset).limit(50).all())
+                        db.session.rollback()
+                        reads += 1
+                        latency.append(time.perf_counter() - start)
+                except OperationalError as e:
+                    db.session.rollback()
+                    if 'locked' not in str(e):
+                        raise
+                    locked += 1
+            db.session.remove()
+        with lock:
+            results['reads'] += reads
+            results['writes'] += writes
+            results['locked'] += locked
+            results['read_latency'].extend(latency)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    latency = results.pop('read_latency')
+    return {'profile': profile, 'journal_mode': journal, **results,
+            'ops_per_second': round((results['reads'] + results['writes']) / seconds, 1),
+            'read_p50_ms': round(_percentile(latency, 0.5) * 1000, 2),
+            'read_p95_ms': round(_percentile(latency, 0.95) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run(args.profile, args.threads, args.seconds, args.write_ratio)))
+        return
+
+    rows = []
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, 'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   'SQLITE_PROFILE': profile, 'WARMUP_ENABLED': 'false',
+                   'DB_POOL_SIZE': str(args.threads), 'DB_MAX_OVERFLOW': '0'}
+            env.pop('DATABASE_REPLICA_URL', None)
+            out = subprocess.run(
+                [sys.executable, __file__, '--profile', profile, '--threads', str(args.threads),
+                 '--seconds', str(args.seconds), '--write-ratio', str(args.write_ratio)],
+                env=env, check=True, capture_output=True, text=True).stdout
+            rows.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'profile':12} {'journal':8} {'ops/s':>8} {'reads':>7} {'writes':>7} {'locked':>7} "
+          f"{'read p50':>9} {'read p95':>9}")
+    for r in rows:
+        print(f"{r['profile']:12} {r['journal_mode']:8} {r['ops_per_second']:>8} {r['reads']:>7} "
+              f"{r['writes']:>7} {r['locked']:>7} {r['read_p50_ms']:>7}ms {r['read_p95_ms']:>7}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,12 +15,103 @@ class Config:
         DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
     
     SQLALCHEMY_DATABASE_URI = DATABASE_URL or 'sqlite:///crm.db'
+
+    # Optional read replica for GET requests (see app/replicas.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    if DATABASE_REPLICA_URL and DATABASE_REPLICA_URL.startswith('postgres://'):
+        DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace('postgres://', 'postgresql://', 1)
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_HEALTH_INTERVAL = float(os.environ.get('REPLICA_HEALTH_INTERVAL', 15))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
+        # Sized per worker by gunicorn.conf.py (threads per worker)
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
     }
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        # A local file: nothing to ping, and no server closing idle connections
+        SQLALCHEMY_ENGINE_OPTIONS.update(pool_pre_ping=False, pool_recycle=-1)
+
+    # Embedded SQLite (app/sqlite_profile.py): production (WAL and tuned pragmas) or default
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'production')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_JOURNAL_SIZE_LIMIT = int(os.environ.get('SQLITE_JOURNAL_SIZE_LIMIT', 64 * 1024 * 1024))
     
+    # Logging (app/log_pipeline.py): json or text lines on stderr, written from a
+    # background thread through a queue of this many records; one record per
+    # request, and the fraction of requests whose DEBUG records are kept
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_REQUESTS = os.environ.get('LOG_REQUESTS', 'true').lower() in ('true', '1', 'yes')
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+
+    # Relationship loading (app/loading.py): raise on unplanned lazy loads, and
+    # log requests that load more ORM rows than this
+    RAISE_ON_LAZY_LOAD = os.environ.get('RAISE_ON_LAZY_LOAD', 'false').lower() in ('true', '1', 'yes')
+    ROWS_LOADED_WARN = int(os.environ.get('ROWS_LOADED_WARN', 2000))
+
+    # Per-request memory profiling with tracemalloc (app/memory_profile.py):
+    # fraction of requests sampled, traceback depth, allocation sites kept,
+    # peak that flags a request, optional JSON lines dump directory
+    MEMORY_PROFILE_ENABLED = os.environ.get('MEMORY_PROFILE_ENABLED', 'false').lower() in ('true', '1', 'yes')
+    MEMORY_PROFILE_SAMPLE_RATE = float(os.environ.get('MEMORY_PROFILE_SAMPLE_RATE', 0.05))
+    MEMORY_PROFILE_FRAMES = int(os.environ.get('MEMORY_PROFILE_FRAMES', 1))
+    MEMORY_PROFILE_TOP = int(os.environ.get('MEMORY_PROFILE_TOP', 10))
+    MEMORY_PROFILE_PEAK_WARN_MB = float(os.environ.get('MEMORY_PROFILE_PEAK_WARN_MB', 20))
+    MEMORY_PROFILE_DIR = os.environ.get('MEMORY_PROFILE_DIR')
+    MEMORY_PROFILE_KEEP = int(os.environ.get('MEMORY_PROFILE_KEEP', 200))
+
+    # Logged-in user cache used by the user_loader; other workers see user changes after at most this many seconds
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 5))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+
+    # Line item typeahead index (app/catalog.py); rebuilt at least this often,
+    # and the most suggestions one lookup may ask for
+    CATALOG_INDEX_TTL = int(os.environ.get('CATALOG_INDEX_TTL', 300))
+    CATALOG_MAX_RESULTS = int(os.environ.get('CATALOG_MAX_RESULTS', 25))
+
+    # Start-up warm-up (app/warmup.py)
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    WARMUP_POOL_CONNECTIONS = int(os.environ.get('WARMUP_POOL_CONNECTIONS', 2))
+    STARTUP_TIME_BUDGET = float(os.environ.get('STARTUP_TIME_BUDGET', 5))
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+
+    # Template fragment cache (app/fragment_cache.py): memory, null or a backend class path
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))
+
+    # Change feed (app/change_feed.py): consumer batch size, how long a consumer
+    # waits at a gap in record ids before moving past it, how long skipped ids
+    # are re-checked (keep it above the longest transaction), and how long
+    # records are kept
+    CHANGE_FEED_BATCH_SIZE = int(os.environ.get('CHANGE_FEED_BATCH_SIZE', 500))
+    CHANGE_FEED_SETTLE_SECONDS = float(os.environ.get('CHANGE_FEED_SETTLE_SECONDS', 5))
+    CHANGE_FEED_GAP_SECONDS = int(os.environ.get('CHANGE_FEED_GAP_SECONDS', 3600))
+    CHANGE_FEED_RETENTION_DAYS = int(os.environ.get('CHANGE_FEED_RETENTION_DAYS', 7))
+
+    # Archival of settled invoices (app/archive.py); 0 turns the daily job off
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 3 * 365))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 200))
+
+    # Background invoice emails queued by bulk issue (app/email_queue.py)
+    EMAIL_QUEUE_BATCH_SIZE = int(os.environ.get('EMAIL_QUEUE_BATCH_SIZE', 20))
+    EMAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+
+    # Maintenance jobs (flask maintenance ...)
+    MAINTENANCE_POLL_SECONDS = int(os.environ.get('MAINTENANCE_POLL_SECONDS', 60))
+    MAINTENANCE_BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE', 500))
+    TOKEN_RETENTION_DAYS = int(os.environ.get('TOKEN_RETENTION_DAYS', 1))
+    STATS_REFRESH_THRESHOLD = int(os.environ.get('STATS_REFRESH_THRESHOLD', 1000))
+    SQLITE_VACUUM_FREE_RATIO = float(os.environ.get('SQLITE_VACUUM_FREE_RATIO', 0.2))
+
     TAX_RATE = float(os.environ.get('TAX_RATE', '0.0825'))
     
     # Supabase API Keys
@@ -35,3 +126,9 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'rickifasttuner@gmail.com')
+
+    # Integration API (/api/v1): comma-separated bearer tokens; the API is closed when empty
+    API_TOKENS = [t.strip() for t in os.environ.get('API_TOKENS', '').split(',') if t.strip()]
+
+    # Metrics (/metrics needs this bearer token; without one only loopback requests are answered)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
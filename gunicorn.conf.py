@@ -0,0 +1,117 @@
+"""Gunicorn settings (loaded automatically from the working directory).
+
+Every value can be overridden through the environment; the defaults are
+derived from the CPUs and memory available to the container.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _memory_limit_mb():
+    """Memory available to this container (cgroup limit, else MemAvailable)."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                raw = f.read().strip()
+        except OSError:
+            continue
+        if raw.isdigit() and int(raw) < 1 << 60:
+            return int(raw) // (1024 * 1024)
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def _default_workers():
+    by_cpu = multiprocessing.cpu_count() * 2 + 1
+    memory = _memory_limit_mb()
+    if memory is None:
+        return by_cpu
+    per_worker = _env_int('GUNICORN_WORKER_MEMORY_MB', 160)
+    return max(1, min(by_cpu, memory // per_worker))
+
+
+# ---- Concurrency ----
+# gthread workers keep serving other requests while one thread waits on
+# SMTP or renders a PDF.
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = max(1, _env_int('WEB_CONCURRENCY', _default_workers()))
+threads = _env_int('GUNICORN_THREADS', 4)
+
+# Load the app once in the master so workers share its memory copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('true', '1', 'yes')
+
+# ---- Timeouts and graceful restarts ----
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+# ---- Per-worker DB pool sizing (read by config.Config) ----
+# One pooled connection per thread, with overflow capped so that
+# workers * (pool_size + max_overflow) stays under DB_MAX_CONNECTIONS.
+db_max_connections = _env_int('DB_MAX_CONNECTIONS', 60)
+pool_size = min(threads, max(1, db_max_connections // workers))
+max_overflow = max(0, min(threads, db_max_connections // workers - pool_size))
+os.environ.setdefault('DB_POOL_SIZE', str(pool_size))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(max_overflow))
+
+# Per-worker Prometheus samples are written here and summed by /metrics.
+# It must exist (and start empty) before the preloaded app imports
+# prometheus_client, so it is prepared while this file is loaded.
+prometheus_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'rickifast-prometheus'))
+shutil.rmtree(prometheus_dir, ignore_errors=True)
+os.makedirs(prometheus_dir, exist_ok=True)
+
+
+def when_ready(server):
+    # Compile templates and import the heavy modules once in the master so
+    # workers share them, then close any connections the preloaded app opened
+    if server.cfg.preload_app:
+        from app import db, warmup
+        from wsgi import app
+        if app.config['WARMUP_ENABLED']:
+            warmup.prepare(app)
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+def post_fork(server, worker):
+    # Connections opened by the master must not be shared with workers
+    if server.cfg.preload_app:
+        from app import db
+        from wsgi import app
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Warm each worker (its own pool included) before it accepts connections
+    from app import db, warmup
+    from wsgi import app
+    if app.config['WARMUP_ENABLED']:
+        warmup.warm_up(app, db)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -3,8 +3,10 @@ Migration script to create Supabase database tables
 This script initializes all tables for the Rickifast Tuning CRM
 """
 from app import create_app, db
-from app.models.models import User, Client, Invoice, InvoiceItem, Payment
+from app.models.models import User
 from dotenv import load_dotenv
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
 
 # Load environment variables
 load_dotenv()
@@ -14,24 +16,27 @@ def init_database():
     app = create_app()
     
     with app.app_context():
-        # Create all tables
-        print("Creating database tables...")
-        db.create_all()
-        print("✓ All tables created successfully!")
-        
+        # Databases created with db.create_all() predate the migrations
+        tables = inspect(db.engine).get_table_names()
+        if 'client' in tables and 'alembic_version' not in tables:
+            print("Existing tables found, marking them as the baseline revision...")
+            stamp(revision='0001')
+
+        print("Applying migrations...")
+        upgrade()
+        print("✓ Database schema is up to date!")
+
         # Print table names
-        print("\nTables created:")
-        print("  - user")
-        print("  - client")
-        print("  - invoice")
-        print("  - invoice_item")
-        print("  - payment")
+        print("\nTables:")
+        for table in sorted(inspect(db.engine).get_table_names()):
+            print(f"  - {table}")
         
         # Check if any users exist
         user_count = User.query.count()
         if user_count == 0:
             print("\n⚠ No users found. You may want to create an admin user.")
             print("  Run: python create_admin.py")
+            print("  Or copy an existing database in: flask --app wsgi data load <dump file>")
         else:
             print(f"\n✓ Database has {user_count} user(s)")
 
@@ -0,0 +1,43 @@
+"""query-shaped indexes
+
+Replaces the hand-run add_indexes.sql. Uses IF [NOT] EXISTS so databases
+that already ran that script upgrade cleanly.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 18:10:05.412876
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_invite_code_pending', 'invite_code', ['created_at'], unique=False,
+                    postgresql_where=sa.text('used = false'), sqlite_where=sa.text('used = 0'),
+                    if_not_exists=True)
+    op.create_index('ix_invoice_status_due_date', 'invoice', ['status', 'due_date'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_payment_invoice_id_payment_date', 'payment', ['invoice_id', 'payment_date'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_payment_date_amount', 'payment', ['payment_date', 'amount'],
+                    unique=False, if_not_exists=True)
+    # Superseded by ix_invoice_status_due_date (only created by add_indexes.sql)
+    op.drop_index('ix_invoice_due_date', table_name='invoice', if_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_payment_date_amount', table_name='payment', if_exists=True)
+    op.drop_index('ix_payment_invoice_id_payment_date', table_name='payment', if_exists=True)
+    op.drop_index('ix_invoice_status_due_date', table_name='invoice', if_exists=True)
+    op.drop_index('ix_invite_code_pending', table_name='invite_code', if_exists=True)
+    op.drop_index('ix_user_username_lower', table_name='user', if_exists=True)
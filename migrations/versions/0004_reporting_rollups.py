@@ -0,0 +1,79 @@
+"""reporting rollup tables
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 21:14:07.530912
+
+The tables are filled from the existing payments and invoices with the
+same rules as app/rollups.py, so reports are right from the first request.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Each invoice's open balance: total less payments, for sent invoices only
+BALANCES = """
+    SELECT COALESCE(i.due_date, {created_on}) AS day,
+           COALESCE(s.subtotal, 0) + COALESCE(s.taxable, 0) * COALESCE(i.tax_rate, 0)
+               - COALESCE(p.paid, 0) AS balance
+    FROM invoice i
+    LEFT JOIN (SELECT invoice_id, SUM(quantity * unit_price) AS subtotal,
+                      SUM(CASE WHEN taxable THEN quantity * unit_price ELSE 0 END) AS taxable
+               FROM invoice_item GROUP BY invoice_id) s ON s.invoice_id = i.id
+    LEFT JOIN (SELECT invoice_id, SUM(amount) AS paid FROM payment GROUP BY invoice_id) p ON p.invoice_id = i.id
+    WHERE COALESCE(i.status, '') != 'draft'
+"""
+
+
+def _created_on():
+    if op.get_bind().dialect.name == 'sqlite':
+        return 'date(i.created_at)'
+    return 'CAST(i.created_at AS DATE)'
+
+
+def upgrade():
+    op.create_table('daily_revenue',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('method', sa.String(length=20), nullable=False),
+    sa.Column('vehicle_make', sa.String(length=50), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('payment_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'method', 'vehicle_make')
+    )
+    with op.batch_alter_table('daily_revenue', schema=None) as batch_op:
+        batch_op.create_index('ix_daily_revenue_make_day', ['vehicle_make', 'day'], unique=False)
+
+    op.create_table('daily_receivable',
+    sa.Column('due_date', sa.Date(), nullable=False),
+    sa.Column('open_balance', sa.Float(), nullable=False),
+    sa.Column('open_invoices', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('due_date')
+    )
+
+    op.execute(
+        "INSERT INTO daily_revenue (day, method, vehicle_make, amount, payment_count) "
+        "SELECT p.payment_date, COALESCE(p.method, 'other'), COALESCE(c.vehicle_make, ''), "
+        "ROUND(CAST(SUM(p.amount) AS NUMERIC), 2), COUNT(*) "
+        "FROM payment p JOIN invoice i ON i.id = p.invoice_id JOIN client c ON c.id = i.client_id "
+        "GROUP BY p.payment_date, COALESCE(p.method, 'other'), COALESCE(c.vehicle_make, '')"
+    )
+    op.execute(
+        "INSERT INTO daily_receivable (due_date, open_balance, open_invoices) "
+        "SELECT day, ROUND(CAST(SUM(balance) AS NUMERIC), 2), COUNT(*) "
+        f"FROM ({BALANCES.format(created_on=_created_on())}) b WHERE balance > 0.005 GROUP BY day"
+    )
+
+
+def downgrade():
+    op.drop_table('daily_receivable')
+    with op.batch_alter_table('daily_revenue', schema=None) as batch_op:
+        batch_op.drop_index('ix_daily_revenue_make_day')
+
+    op.drop_table('daily_revenue')
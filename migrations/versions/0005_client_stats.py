@@ -0,0 +1,74 @@
+"""client stats rollup
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 22:40:51.204377
+
+Every client gets a row, filled from its invoices and payments with the
+same rules as app/rollups.py.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Each invoice's client, creation day, amount paid and open balance
+INVOICES = """
+    SELECT i.client_id, {created_on} AS created_on, COALESCE(p.paid, 0) AS paid,
+           CASE WHEN COALESCE(i.status, '') = 'draft' THEN 0
+                ELSE COALESCE(s.subtotal, 0) + COALESCE(s.taxable, 0) * COALESCE(i.tax_rate, 0)
+                     - COALESCE(p.paid, 0) END AS balance
+    FROM invoice i
+    LEFT JOIN (SELECT invoice_id, SUM(quantity * unit_price) AS subtotal,
+                      SUM(CASE WHEN taxable THEN quantity * unit_price ELSE 0 END) AS taxable
+               FROM invoice_item GROUP BY invoice_id) s ON s.invoice_id = i.id
+    LEFT JOIN (SELECT invoice_id, SUM(amount) AS paid FROM payment GROUP BY invoice_id) p ON p.invoice_id = i.id
+"""
+
+
+def _created_on():
+    if op.get_bind().dialect.name == 'sqlite':
+        return 'date(i.created_at)'
+    return 'CAST(i.created_at AS DATE)'
+
+
+def upgrade():
+    op.create_table('client_stats',
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('lifetime_paid', sa.Float(), nullable=False),
+    sa.Column('open_balance', sa.Float(), nullable=False),
+    sa.Column('invoice_count', sa.Integer(), nullable=False),
+    sa.Column('first_invoice_on', sa.Date(), nullable=True),
+    sa.Column('last_invoice_on', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['client_id'], ['client.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('client_id')
+    )
+    with op.batch_alter_table('client_stats', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_client_stats_last_invoice_on'), ['last_invoice_on'], unique=False)
+        batch_op.create_index(batch_op.f('ix_client_stats_lifetime_paid'), ['lifetime_paid'], unique=False)
+        batch_op.create_index(batch_op.f('ix_client_stats_open_balance'), ['open_balance'], unique=False)
+
+    op.execute(
+        'INSERT INTO client_stats '
+        '(client_id, lifetime_paid, open_balance, invoice_count, first_invoice_on, last_invoice_on) '
+        'SELECT c.id, ROUND(CAST(COALESCE(SUM(b.paid), 0) AS NUMERIC), 2), '
+        'ROUND(CAST(COALESCE(SUM(CASE WHEN b.balance > 0.005 THEN b.balance ELSE 0 END), 0) AS NUMERIC), 2), '
+        'COUNT(b.client_id), MIN(b.created_on), MAX(b.created_on) '
+        f'FROM client c LEFT JOIN ({INVOICES.format(created_on=_created_on())}) b ON b.client_id = c.id '
+        'GROUP BY c.id'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('client_stats', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_client_stats_open_balance'))
+        batch_op.drop_index(batch_op.f('ix_client_stats_lifetime_paid'))
+        batch_op.drop_index(batch_op.f('ix_client_stats_last_invoice_on'))
+
+    op.drop_table('client_stats')
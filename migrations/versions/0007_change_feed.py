@@ -0,0 +1,46 @@
+"""change feed and consumer offsets
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-20 09:14:37.502916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_feed',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=6), nullable=False),
+    sa.Column('changes', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('change_feed', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_change_feed_created_at'), ['created_at'], unique=False)
+
+    op.create_table('feed_offset',
+    sa.Column('consumer', sa.String(length=64), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('consumer')
+    )
+
+
+def downgrade():
+    op.drop_table('feed_offset')
+    with op.batch_alter_table('change_feed', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_change_feed_created_at'))
+
+    op.drop_table('change_feed')
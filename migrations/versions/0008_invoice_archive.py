@@ -0,0 +1,84 @@
+"""archive tables for settled invoices
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-20 11:02:45.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_invoice',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('invoice_number', sa.String(length=20), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('due_date', sa.Date(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('tax_rate', sa.Float(), nullable=True),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('paid', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['client.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('invoice_number')
+    )
+    with op.batch_alter_table('archived_invoice', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_invoice_client_id'), ['client_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_archived_invoice_created_at'), ['created_at'], unique=False)
+
+    op.create_table('archived_invoice_item',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('invoice_id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=True),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('taxable', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['invoice_id'], ['archived_invoice.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_invoice_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_invoice_item_invoice_id'), ['invoice_id'], unique=False)
+
+    op.create_table('archived_payment',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('invoice_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('payment_date', sa.Date(), nullable=True),
+    sa.Column('method', sa.String(length=20), nullable=True),
+    sa.Column('reference_note', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['invoice_id'], ['archived_invoice.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_payment', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_payment_invoice_id'), ['invoice_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_archived_payment_payment_date'), ['payment_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archived_payment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_payment_payment_date'))
+        batch_op.drop_index(batch_op.f('ix_archived_payment_invoice_id'))
+
+    op.drop_table('archived_payment')
+    with op.batch_alter_table('archived_invoice_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_invoice_item_invoice_id'))
+
+    op.drop_table('archived_invoice_item')
+    with op.batch_alter_table('archived_invoice', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_invoice_created_at'))
+        batch_op.drop_index(batch_op.f('ix_archived_invoice_client_id'))
+
+    op.drop_table('archived_invoice')
@@ -0,0 +1,52 @@
+"""invoice templates and queued invoice emails
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-20 15:41:08.227610
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('invoice_template',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('tax_rate', sa.Float(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('items', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('queued_email',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('invoice_id', sa.Integer(), nullable=False),
+    sa.Column('recipients', sa.String(length=500), nullable=False),
+    sa.Column('queued_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(length=200), nullable=True),
+    sa.ForeignKeyConstraint(['invoice_id'], ['invoice.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('queued_email', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_queued_email_invoice_id'), ['invoice_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_queued_email_sent_at'), ['sent_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('queued_email', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_queued_email_sent_at'))
+        batch_op.drop_index(batch_op.f('ix_queued_email_invoice_id'))
+
+    op.drop_table('queued_email')
+    op.drop_table('invoice_template')
@@ -0,0 +1,39 @@
+"""service and parts catalog
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-20 17:26:51.904337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_item',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('taxable', sa.Boolean(), nullable=False),
+    sa.Column('times_used', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('description')
+    )
+    with op.batch_alter_table('catalog_item', schema=None) as batch_op:
+        batch_op.create_index('ix_catalog_item_description_lower', [sa.text('lower(description)')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('catalog_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_catalog_item_description_lower')
+
+    op.drop_table('catalog_item')
@@ -0,0 +1,26 @@
+"""client name prefix indexes for the client picker
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-20 19:03:12.655180
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_client_last_name_lower', 'client', [sa.text('lower(last_name)')], unique=False)
+    op.create_index('ix_client_first_name_lower', 'client', [sa.text('lower(first_name)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_client_first_name_lower', table_name='client')
+    op.drop_index('ix_client_last_name_lower', table_name='client')
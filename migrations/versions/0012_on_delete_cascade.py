@@ -0,0 +1,41 @@
+"""ON DELETE CASCADE for invoices, line items and payments
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-21 10:12:44.381907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+# PostgreSQL's names for the unnamed constraints created in 0001; SQLite's
+# unnamed constraints are given the same names when the tables are rebuilt
+NAMING = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+FOREIGN_KEYS = (
+    ('invoice', 'client_id', 'client'),
+    ('invoice_item', 'invoice_id', 'invoice'),
+    ('payment', 'invoice_id', 'invoice'),
+)
+
+
+def _replace_foreign_keys(ondelete):
+    for table, column, referent in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referent, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
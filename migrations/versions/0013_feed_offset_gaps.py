@@ -0,0 +1,26 @@
+"""skipped change feed ids per consumer
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-22 11:03:18.640215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('feed_offset', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('gaps', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('feed_offset', schema=None) as batch_op:
+        batch_op.drop_column('gaps')
@@ -0,0 +1,50 @@
+"""never reuse invoice, line item and payment ids on SQLite
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-23 09:41:52.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0014'
+down_revision = '0013'
+branch_labels = None
+depends_on = None
+
+# Archived rows keep their original ids (0008), so SQLite must not hand
+# them out again once they have left the hot table. PostgreSQL sequences
+# never go back and need nothing.
+TABLES = (
+    ('invoice', 'archived_invoice'),
+    ('invoice_item', 'archived_invoice_item'),
+    ('payment', 'archived_payment'),
+)
+
+
+def _rebuild(autoincrement):
+    for table, _ in TABLES:
+        with op.batch_alter_table(table, schema=None, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild(True)
+    # Start each sequence past every id used so far, hot or archived
+    for table, archive in TABLES:
+        highest = f'(SELECT MAX(id) FROM (SELECT id FROM {table} UNION ALL SELECT id FROM {archive}))'
+        op.execute(f"UPDATE sqlite_sequence SET seq = MAX(seq, COALESCE({highest}, 0)) WHERE name = '{table}'")
+        op.execute(f"INSERT INTO sqlite_sequence (name, seq) SELECT '{table}', {highest} "
+                   f"WHERE {highest} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = '{table}')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild(False)